@@ -10,11 +10,19 @@ from utils.preprocessing import strip_whitespace, get_group_intersections
 from utils.entities import StudentGroup, Teacher, Room, Timeslot, Lesson, TimeTable
 from utils.time_utils import get_teacher_availability, get_timeslot_list
 from utils.constraints import define_constraints, get_solver_config, SOLVING_DURATION
-from utils.files import process_file, convert_df_to_csv
+from utils.files import process_file, convert_df_to_csv, write_schedule_workbook, schedule_csv_files
 from utils.data import DataManager
-from utils.schedule import ScheduleManager
+from utils.schedule import ScheduleManager, selected_lesson_id, group_pairs_frame
+from utils.jobs import SolveJobManager, JOB_FAILED
+from utils.solvers import get_solver_registry
+from utils.termination import get_termination_policy, score_levels, is_feasible
+from utils.whatif import AlternativeSlotFinder
+from utils.feasibility import analyze_feasibility, blocking_issues, issues_to_frame
+from utils.explanation import explain_solution
+from utils.store import ScheduleStore, VERSION_EDIT, VERSION_UPLOAD
 from collections import defaultdict
 from datetime import time
+from time import sleep
 from optapy import solver_factory_create, score_manager_create
 from loguru import logger
 
@@ -30,47 +38,145 @@ import zipfile
 
 from optapy import constraint_provider, get_class
 from optapy.constraint import Joiners
-from optapy.score import HardSoftScore
+from optapy.score import HardMediumSoftScore
 
 RESULT_DATA_PATH  = 'new_schedule/input'
-
-def generate_new_schedule():
-    data_manager = DataManager(RESULT_DATA_PATH)
+JOB_POLL_SECONDS = 1
+MAX_ALTERNATIVES = 10
+TERMINATION_POLICY_LABELS = {
+    'adaptive': 'When feasible, stalled, or at a size-based time cap',
+    'first_feasible': 'At the first feasible schedule',
+    'fixed': f'After a fixed {SOLVING_DURATION} seconds',
+}
+
+@st.cache_resource
+def get_cached_solver_registry():
+    # Process-wide, so solver factories built for one session are reused by every later solve
+    return get_solver_registry()
+
+
+@st.cache_resource
+def get_job_manager():
+    return SolveJobManager(get_cached_solver_registry())
+
+
+@st.cache_resource
+def get_schedule_store():
+    return ScheduleStore()
+
+
+def generate_new_schedule(workbook=None, termination_name='adaptive', check_feasibility=True):
+    data_manager = DataManager(RESULT_DATA_PATH, workbook=workbook)
+    if check_feasibility:
+        # Rejects input that can't have a schedule without conflicts before any solving
+        issues = analyze_feasibility(data_manager)
+        blocking = blocking_issues(issues)
+        if blocking:
+            st.error(f"Input data can't be scheduled without conflicts, found {len(blocking)} problems")
+            st.dataframe(issues_to_frame(issues))
+            return
+        if issues:
+            st.warning(f"Some lessons are left out of the schedule, found {len(issues)} problems")
+            st.dataframe(issues_to_frame(issues))
     problem = data_manager.generate_optapy_problem()
-    solver_config = get_solver_config()
-    solver_factory = solver_factory_create(solver_config)
-    solver = solver_factory.buildSolver()
-    st.write(f"Going to create schedule, it will take  {SOLVING_DURATION} seconds")
-
-    solution = solver.solve(problem)
-    score_manager = score_manager_create(solver_factory)
-    explanation = score_manager.explainScore(solution)
-    
-    st.write(f"Final score: {str(solution.get_score())}")
-    # st.write(f"Score explenation: {str(explanation)}")
+    submit_schedule_job(problem, get_termination_policy(termination_name, len(problem.lesson_list)))
+
 
-    schedule_manager = ScheduleManager(optapy_solution=solution)
-    raw_schedule_df = schedule_manager.raw_schedule_df
-    pretty_schedule_df = schedule_manager.raw_schedule_to_pretty(raw_schedule_df)
-    raw_schedule_csv = convert_df_to_csv(raw_schedule_df)
-    pretty_schedule_csv = convert_df_to_csv(pretty_schedule_df)
+def resolve_existing_schedule(raw_schedule_df, workbook=None):
+    # Every lesson may move, the soft level counts the moves away from raw_schedule_df
+    data_manager = DataManager(RESULT_DATA_PATH, existing_schedule_df=raw_schedule_df, workbook=workbook)
+    problem = data_manager.generate_optapy_problem(pin_existing=False)
+    submit_schedule_job(problem, get_termination_policy('minimal_changes', len(problem.lesson_list)),
+                        parent_version_id=st.session_state.get('schedule_version_id'))
 
 
+def submit_schedule_job(problem, termination, parent_version_id=None):
+    job_manager = get_job_manager()
+    previous_job = job_manager.get(st.session_state.get('schedule_job_id'))
+    if previous_job is not None and not previous_job.done:
+        job_manager.terminate(previous_job.job_id)
+    st.session_state['schedule_job_id'] = job_manager.submit(problem, termination)
+    # The version a re-solve started from, the finished schedule is saved as its child
+    st.session_state['schedule_job_parent_id'] = parent_version_id
 
+
+def build_schedule_zip(schedule_manager):
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED, False) as zip_file:
-        zip_file.writestr('raw_schedule.csv', raw_schedule_csv)
-        zip_file.writestr('pretty_schedule.csv', pretty_schedule_csv)
-
-    zip_buffer.seek(0)
+        for file_name, csv in schedule_csv_files(schedule_manager).items():
+            zip_file.writestr(file_name, csv)
+
+    return zip_buffer.getvalue()
+
+
+def show_schedule_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        # Pruned or started by another server process
+        del st.session_state['schedule_job_id']
+        return False
+
+    progress_area = st.container()
+    if not job.done:
+        progress_area.write(f"Going to create schedule, it will take at most {job.termination.spent_limit_seconds} seconds")
+        progress_area.progress(min(job.elapsed / job.termination.spent_limit_seconds, 1.0))
+        if job.best_score is not None:
+            progress_area.write(f"Best score so far: {job.best_score}")
+            progress_area.dataframe(pd.DataFrame(job.score_history, columns=['seconds', 'score']))
+        return True
+
+    if job.status == JOB_FAILED:
+        progress_area.error(f"Schedule generation failed: {job.error}")
+        return False
+
+    solving_seconds = job.time_spent_ms / 1000 if job.time_spent_ms is not None else job.elapsed
+    progress_area.write(f"Final score: {job.best_score} (stopped by {job.termination_reason} after {solving_seconds:.1f} seconds)")
+    levels = score_levels(job.best_score)
+    if not is_feasible(job.best_score):
+        progress_area.warning(f"{-levels['hard']} conflicts left, see the score explanation below")
+    elif levels['medium'] < 0:
+        progress_area.warning(f"No conflicts, but {-levels['medium']} lessons are in forbidden timeslots")
+    else:
+        progress_area.success("No conflicts")
+    if job.result is None:
+        schedule_manager = ScheduleManager(optapy_solution=job.best_solution,
+                                           score_manager=get_cached_solver_registry().score_manager())
+        job.result = {
+            'zip': build_schedule_zip(schedule_manager),
+            'workbook': write_schedule_workbook(schedule_manager),
+            'parent_version_id': st.session_state.get('schedule_job_parent_id'),
+        }
+        job.result['version_id'] = get_schedule_store().save(schedule_manager.raw_schedule_df, parent_id=job.result['parent_version_id'],
+                                                             score=str(job.best_score),
+                                                             group_pairs_df=group_pairs_frame(job.best_solution))
+    progress_area.write(f"Saved as schedule version {job.result['version_id']}")
+    if job.result['parent_version_id'] is not None:
+        moved_df = get_schedule_store().diff(job.result['parent_version_id'], job.result['version_id'])
+        with st.expander(f"{moved_df.shape[0]} lessons changed from version {job.result['parent_version_id']}"):
+            st.dataframe(moved_df)
+
+    # Already explained while building the downloads, this is a cache hit
+    score_report = explain_solution(job.best_solution, get_cached_solver_registry().score_manager())
+    with st.expander(f"Score explanation: {len(score_report.indictments)} lessons with conflicts"):
+        st.dataframe(score_report.constraint_totals)
+        st.dataframe(score_report.indictments)
 
     # Create a link to download the zip file
     st.download_button(
         label="Download Schedules as ZIP",
-        data=zip_buffer,
+        data=job.result['zip'],
         file_name='schedules.zip',
         mime='application/zip'
     )
+    # Spooled to disk when large, read back only for the download
+    job.result['workbook'].seek(0)
+    st.download_button(
+        label="Download schedule workbook",
+        data=job.result['workbook'].read(),
+        file_name='schedule.xlsx',
+        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    return False
 
 if 'alternatives_for_selected_lesson' not in st.session_state:
     st.session_state['alternatives_for_selected_lesson'] = []
@@ -82,73 +188,100 @@ def main():
     st.title('Schedule optimisation')
 
     uploaded_file = st.file_uploader("Input data for schedule")
+    workbook = None
     if uploaded_file is not None:
-        process_file(uploaded_file, RESULT_DATA_PATH)
+        # Parsed once per distinct upload, later reruns reuse the in-memory frames
+        workbook = process_file(uploaded_file, RESULT_DATA_PATH)
     
+    termination_name = st.selectbox('Stop solving', list(TERMINATION_POLICY_LABELS), format_func=lambda name: TERMINATION_POLICY_LABELS[name])
+    solve_anyway = st.checkbox('Solve even if the input data has provable conflicts')
     if st.button('Generate new schedule'):
-        generate_new_schedule()
+        generate_new_schedule(workbook, termination_name, check_feasibility=not solve_anyway)
 
+    job_running = False
+    if 'schedule_job_id' in st.session_state:
+        job_running = show_schedule_job(st.session_state['schedule_job_id'])
+
+    store = get_schedule_store()
+    versions_df = store.versions()
     existing_schedule_file = st.file_uploader("Existing raw schedule")
+    version_labels = {row.id: f"{row.id}: {row.source} {row.score or ''} {row.created_at}" for row in versions_df.itertuples()}
+    stored_version_id = st.selectbox('Or open a saved schedule version', [None] + list(version_labels),
+                                     format_func=lambda version_id: '' if version_id is None else version_labels[version_id])
 
+    raw_schedule_df = None
     if existing_schedule_file is not None:
         logger.debug('Existing schedule')
         raw_schedule_df = pd.read_csv(existing_schedule_file)
-
+        # Each distinct upload becomes a version once, so edits made from it have a parent
+        uploaded_versions = st.session_state.setdefault('uploaded_schedule_versions', {})
+        if existing_schedule_file.file_id not in uploaded_versions:
+            # Student conflicts of the upload are checked against the current input's groups
+            group_pairs_df = DataManager(RESULT_DATA_PATH, workbook=workbook).group_intersections.to_frame()
+            uploaded_versions[existing_schedule_file.file_id] = store.save(raw_schedule_df, source=VERSION_UPLOAD,
+                                                                           group_pairs_df=group_pairs_df)
+        st.session_state['schedule_version_id'] = uploaded_versions[existing_schedule_file.file_id]
+    elif stored_version_id is not None:
+        raw_schedule_df = store.load(stored_version_id)
+        st.session_state['schedule_version_id'] = stored_version_id
+
+    if raw_schedule_df is not None:
         schedule_manager = ScheduleManager(raw_schedule_df=raw_schedule_df)
-        import pdb
+
+        if st.button('Re-solve with as few changes as possible'):
+            resolve_existing_schedule(raw_schedule_df, workbook)
+            st.rerun()
 
         selected_option = st.selectbox('Choose the lection you would like to resckedule:', raw_schedule_df['text'].values.tolist())
 
         if st.button('Show me alternative time splots'):
 
-            lesson_id = int(re.search(r'\[([0-9]+)\]', selected_option).group(1))
+            lesson_id = selected_lesson_id(raw_schedule_df, selected_option)
 
             logger.debug(f'Selected lesson_id {lesson_id}')
             seleted_lesson_row = raw_schedule_df[raw_schedule_df['lesson_id'] == lesson_id].iloc[0]
             forbidden_time_slots = {seleted_lesson_row['time_slot_id']: 1}
             logger.debug(f'Initial forbidden time slots: {forbidden_time_slots}')
-            data_manager = DataManager(RESULT_DATA_PATH, existing_schedule_df=raw_schedule_df)
-
-
-
-            for i in range(2):
-                logger.debug(f'For i : {i} forbidden time slots: {forbidden_time_slots}')
-                problem = data_manager.generate_optapy_problem(reschedule_lesson_id=lesson_id, forbidden_time_slots=forbidden_time_slots)
-                solver_config = get_solver_config()
-                solver_factory = solver_factory_create(solver_config)
-                solver = solver_factory.buildSolver()
-                st.write(f"Going to create schedule, it will take  {SOLVING_DURATION} seconds")
-
-                solution = solver.solve(problem)
-                #st.write(f"Final score: {str(solution.get_score())}")
-                if str(solution.get_score()) != '0hard/0soft': 
-                    logger.debug('Solution is not good')
-                    continue
-                else:
-                    st.write(f"We have one more alternative slot")
-                
-                new_raw_schedule_df = ScheduleManager(optapy_solution=solution).raw_schedule_df
-                new_lesson_raw_schedule = new_raw_schedule_df[new_raw_schedule_df['lesson_id'] == lesson_id].iloc[0]
-                forbidden_time_slots.update({new_lesson_raw_schedule['time_slot_id']: 1})
-                logger.debug(f'Forbidden time slots: {forbidden_time_slots}')
-                logger.debug(f"New time slot: {new_lesson_raw_schedule['time_slot_id']}")
+            data_manager = DataManager(RESULT_DATA_PATH, existing_schedule_df=raw_schedule_df, workbook=workbook)
+
+
+
+            finder = AlternativeSlotFinder(data_manager, raw_schedule_df)
+            options_df = finder.find_alternatives(lesson_id, forbidden_timeslot_ids=forbidden_time_slots, limit=MAX_ALTERNATIVES)
+            logger.debug(f'Found {options_df.shape[0]} alternatives with {options_df["conflicts"].min() if not options_df.empty else None} conflicts')
 
+            st.session_state['alternatives_for_selected_lesson'] = []
+            st.session_state['alternatives_new_raw_schedule_df'] = []
+            current_conflicts = store.conflicts(st.session_state['schedule_version_id'], lesson_id=lesson_id)
+            if not current_conflicts.empty:
+                st.write(f"Lesson {lesson_id} currently has {current_conflicts.shape[0]} conflicts:")
+                st.dataframe(current_conflicts)
+            if not options_df.empty and options_df['conflicts'].iloc[0] > 0:
+                option = options_df.iloc[0]
+                st.write(f"No conflict-free slot, the best options have {option['conflicts']} conflicts, e.g.:")
+                st.dataframe(pd.DataFrame(finder.describe_conflicts(lesson_id, option['time_slot_id'], option['room_id'])))
+
+            for _, option in options_df.iterrows():
                 st.session_state['alternatives_for_selected_lesson'].append(
-                    f"{new_lesson_raw_schedule['day']} {new_lesson_raw_schedule['start_time']} {new_lesson_raw_schedule['room']}"
+                    f"{option['day']} {option['start_time']} {option['room']}"
+                )
+                st.session_state['alternatives_new_raw_schedule_df'].append(
+                    finder.apply_move(raw_schedule_df, lesson_id, option['time_slot_id'], option['room_id'])
                 )
-                st.session_state['alternatives_new_raw_schedule_df'].append(new_raw_schedule_df)
-                logger.debug(st.session_state['alternatives_for_selected_lesson'])
+            logger.debug(st.session_state['alternatives_for_selected_lesson'])
 
-    print('UPDATED VERSIONS')
     if st.session_state['alternatives_for_selected_lesson']:
         selected_option = st.selectbox('Please choose alternative time slot:', st.session_state['alternatives_for_selected_lesson'])
 
         if st.button('Update schedule'):
             selected_index = st.session_state['alternatives_for_selected_lesson'].index(selected_option)
             new_raw_schedule_df = st.session_state['alternatives_new_raw_schedule_df'][selected_index]
-            
-            import pdb
-            pdb.set_trace()
+
+            parent_version_id = st.session_state.get('schedule_version_id')
+            new_version_id = store.save(new_raw_schedule_df, parent_id=parent_version_id, source=VERSION_EDIT)
+            st.write(f"Saved as schedule version {new_version_id}")
+            if parent_version_id is not None:
+                st.dataframe(store.diff(parent_version_id, new_version_id))
 
             new_pretty_schedule_df = schedule_manager.raw_schedule_to_pretty(new_raw_schedule_df)
             raw_schedule_csv = convert_df_to_csv(new_raw_schedule_df)
@@ -158,6 +291,8 @@ def main():
             with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED, False) as zip_file:
                 zip_file.writestr('raw_schedule.csv', raw_schedule_csv)
                 zip_file.writestr('pretty_schedule.csv', pretty_schedule_csv)
+                zip_file.writestr('teacher_schedule.csv', convert_df_to_csv(schedule_manager.view('teacher', new_raw_schedule_df)))
+                zip_file.writestr('group_schedule.csv', convert_df_to_csv(schedule_manager.view('group', new_raw_schedule_df)))
 
             zip_buffer.seek(0)
 
@@ -169,6 +304,11 @@ def main():
                 mime='application/zip'
             )
 
+    # Poll the background solve after the whole page is drawn, so other widgets stay usable
+    if job_running:
+        sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
 
 if __name__ == "__main__":
     main()
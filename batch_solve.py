@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loguru import logger
+
+from utils.cache import INPUT_FILES
+from utils.termination import TERMINATION_POLICIES
+
+STATUS_SOLVED = 'solved'
+STATUS_INFEASIBLE_INPUT = 'infeasible input'
+STATUS_FAILED = 'failed'
+SUMMARY_FILE = 'summary.json'
+
+
+def is_input_dir(path):
+    return os.path.isdir(path) and all(os.path.exists(os.path.join(path, name)) for name in INPUT_FILES)
+
+
+def expand_inputs(paths):
+    # A workbook, a directory of input CSVs, or a directory holding workbooks and input directories
+    inputs = []
+    for path in paths:
+        if os.path.isfile(path) and path.endswith('.xlsx'):
+            inputs.append(path)
+        elif is_input_dir(path):
+            inputs.append(path)
+        elif os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                child = os.path.join(path, name)
+                if (os.path.isfile(child) and name.endswith('.xlsx') and not name.startswith('~$')) or is_input_dir(child):
+                    inputs.append(child)
+        else:
+            raise ValueError(f'{path} is neither an .xlsx workbook nor a directory')
+    return inputs
+
+
+def output_names(inputs):
+    # One output directory per input, named after it; repeated names get a counter
+    names = []
+    used = {}
+    for path in inputs:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        used[name] = used.get(name, 0) + 1
+        names.append(name if used[name] == 1 else f'{name}-{used[name]}')
+    return names
+
+
+def init_worker(jvm_args):
+    # Each worker starts its own JVM once and keeps it, with its solver registry, for every input it gets
+    if jvm_args:
+        import optapy
+        optapy.init(*jvm_args)
+
+
+def solve_input(input_path, output_path, termination_name, seconds, check_feasibility, use_cache, partitioned_workers=None):
+    # Runs in a worker process; failures are reported in the result so the rest of the batch goes on
+    result = {'input': input_path, 'output': output_path, 'status': STATUS_FAILED, 'worker_pid': os.getpid(), 'timings': {}}
+    timings = result['timings']
+    start = time.perf_counter()
+    try:
+        from utils.data import DataManager
+        from utils.feasibility import analyze_feasibility, blocking_issues, issues_to_frame
+        from utils.files import read_uploaded_workbook, schedule_csv_files, write_schedule_workbook
+        from utils.partition import solve_partitioned
+        from utils.profiling import get_solver_statistics
+        from utils.schedule import ScheduleManager
+        from utils.solvers import get_solver_registry
+        from utils.termination import get_termination_policy, score_levels, is_feasible
+
+        step = time.perf_counter()
+        if os.path.isdir(input_path):
+            data_manager = DataManager(input_path, use_cache=use_cache)
+        else:
+            with open(input_path, 'rb') as f:
+                data_manager = DataManager(workbook=read_uploaded_workbook(f), use_cache=use_cache)
+        timings['load_s'] = round(time.perf_counter() - step, 3)
+        os.makedirs(output_path, exist_ok=True)
+
+        step = time.perf_counter()
+        issues = analyze_feasibility(data_manager)
+        timings['feasibility_s'] = round(time.perf_counter() - step, 3)
+        # Warnings, like lessons of unknown teachers, are written out but never stop solving
+        result['provable_issues'] = len(blocking_issues(issues))
+        result['feasibility_warnings'] = len(issues) - result['provable_issues']
+        if issues:
+            issues_to_frame(issues).to_csv(os.path.join(output_path, 'feasibility_issues.csv'), index=False)
+            if check_feasibility and result['provable_issues']:
+                result['status'] = STATUS_INFEASIBLE_INPUT
+                return result
+
+        step = time.perf_counter()
+        problem = data_manager.generate_optapy_problem()
+        termination = get_termination_policy(termination_name, len(problem.lesson_list), seconds)
+        result['lessons'] = len(problem.lesson_list)
+        timings['build_s'] = round(time.perf_counter() - step, 3)
+
+        if partitioned_workers:
+            # Independent components are solved in their own processes, only the wall clock is known here
+            step = time.perf_counter()
+            solution, part_scores, unresolved = solve_partitioned(problem, termination, partitioned_workers)
+            score = get_solver_registry().score_manager().updateScore(solution)
+            timings['solve_s'] = round(time.perf_counter() - step, 3)
+            result.update({'part_scores': part_scores, 'stopped_by': f'partitioned, {len(unresolved)} room clashes left'})
+        else:
+            solver = get_solver_registry().build_solver(termination=termination)
+            solution = solver.solve(problem)
+            statistics = get_solver_statistics(solver)
+            score = solution.get_score()
+            timings['solve_s'] = round(statistics['time_spent_ms'] / 1000, 3)
+            timings['best_solution_s'] = round(statistics['best_solution_time_ms'] / 1000, 3)
+            result.update({
+                'stopped_by': termination.termination_reason(score, statistics['time_spent_ms'],
+                                                             statistics['best_solution_time_ms']),
+                'score_calculation_speed': statistics['score_calculation_speed'],
+            })
+        result.update({'score': str(score), **score_levels(score), 'feasible': is_feasible(score)})
+
+        step = time.perf_counter()
+        schedule_manager = ScheduleManager(optapy_solution=solution, score_manager=get_solver_registry().score_manager())
+        for file_name, csv in schedule_csv_files(schedule_manager).items():
+            with open(os.path.join(output_path, file_name), 'w') as f:
+                f.write(csv)
+        workbook = write_schedule_workbook(schedule_manager)
+        with open(os.path.join(output_path, 'schedule.xlsx'), 'wb') as f:
+            shutil.copyfileobj(workbook, f)
+        workbook.close()
+        result['lessons_with_conflicts'] = len(schedule_manager.score_report.indictments)
+        timings['export_s'] = round(time.perf_counter() - step, 3)
+        result['status'] = STATUS_SOLVED
+    except Exception as e:
+        logger.exception(f'Solving {input_path} failed')
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        timings['total_s'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve many input workbooks or CSV directories without the UI, '
+                                                 'one JVM per worker process')
+    parser.add_argument('inputs', nargs='+',
+                        help='.xlsx workbooks, directories with the input CSVs, or directories holding either')
+    parser.add_argument('--output', required=True, help='Directory for one output directory per input')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes, each with its own JVM. Solvers are single threaded, so one per core')
+    parser.add_argument('--termination', choices=list(TERMINATION_POLICIES), default='adaptive')
+    parser.add_argument('--seconds', type=int, default=None,
+                        help='Hard cap on solving time per input, by default scaled with the lesson count')
+    parser.add_argument('--force', action='store_true', help='Solve even if the input data has provable conflicts')
+    parser.add_argument('--partitioned', type=int, default=None, metavar='WORKERS',
+                        help='Solve the independent lesson components of each input in this many extra processes; '
+                             'lower --workers to match')
+    parser.add_argument('--cache', action='store_true', help='Reuse and store preprocessed data in the on-disk cache')
+    parser.add_argument('--jvm-arg', action='append', default=[], dest='jvm_args', metavar='ARG',
+                        help='Passed to every worker JVM, e.g. --jvm-arg=-Xmx2g to share memory between many workers')
+    parser.add_argument('--summary', default=None,
+                        help=f'JSON summary path, {SUMMARY_FILE} in the output directory by default; - for stdout')
+    args = parser.parse_args()
+
+    try:
+        inputs = expand_inputs(args.inputs)
+    except ValueError as e:
+        parser.error(str(e))
+    if not inputs:
+        parser.error('no input workbooks or directories found')
+    os.makedirs(args.output, exist_ok=True)
+    workers = max(1, min(args.workers, len(inputs)))
+    logger.info(f'Solving {len(inputs)} inputs with {workers} workers')
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    start = time.perf_counter()
+    names = output_names(inputs)
+    results = [None] * len(inputs)
+    # JPype can't survive a fork, workers are started fresh
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(args.jvm_args,)) as executor:
+        futures = {
+            executor.submit(solve_input, path, os.path.join(args.output, name), args.termination, args.seconds,
+                            not args.force, args.cache, args.partitioned): num
+            for num, (path, name) in enumerate(zip(inputs, names))
+        }
+        for future in as_completed(futures):
+            num = futures[future]
+            path, name = inputs[num], names[num]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died, e.g. the JVM crashed; the pool can't run anything after that
+                result = {'input': path, 'output': os.path.join(args.output, name), 'status': STATUS_FAILED,
+                          'error': f'{type(e).__name__}: {e}', 'timings': {}}
+            results[num] = result
+            logger.info(f"{path}: {result['status']} {result.get('score', result.get('error', ''))} "
+                        f"in {result['timings'].get('total_s', 0)}s")
+
+    summary = {
+        'started_at': started_at,
+        'wall_s': round(time.perf_counter() - start, 3),
+        'workers': workers,
+        'termination': args.termination,
+        'seconds': args.seconds,
+        'partitioned': args.partitioned,
+        'counts': {status: sum(result['status'] == status for result in results)
+                   for status in [STATUS_SOLVED, STATUS_INFEASIBLE_INPUT, STATUS_FAILED]},
+        # In input order, not completion order
+        'results': results,
+    }
+    if args.summary == '-':
+        json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        summary_path = args.summary or os.path.join(args.output, SUMMARY_FILE)
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        logger.info(f'Wrote summary to {summary_path}')
+    return 1 if summary['counts'][STATUS_FAILED] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import argparse
+import pandas as pd
+from optapy import solver_factory_create, score_manager_create
+
+from utils.data import DataManager
+from utils.constraints import build_constraint_provider, get_constraints, get_solver_config
+from utils.profiling import CallbackProfiler, get_solver_statistics, get_constraint_match_totals
+
+RESULT_DATA_PATH = 'new_schedule/input'
+
+
+def solve(problem, constraint_provider_function, seconds):
+    solver_factory = solver_factory_create(get_solver_config(constraint_provider_function, seconds))
+    solver = solver_factory.buildSolver()
+    solution = solver.solve(problem)
+    explanation = score_manager_create(solver_factory).explainScore(solution)
+    return solution, get_solver_statistics(solver), get_constraint_match_totals(explanation)
+
+
+def profile_callbacks(problem, seconds):
+    # One solve with every constraint, every Python callback counted and timed
+    profiler = CallbackProfiler()
+    solution, statistics, match_totals = solve(problem, build_constraint_provider(profiler=profiler), seconds)
+    callbacks_df = profiler.to_frame()
+
+    print(f"Final score: {solution.get_score()}")
+    print(f"Score calculations: {statistics['score_calculation_count']} "
+          f"({statistics['score_calculation_speed']}/sec over {statistics['time_spent_ms']} ms)")
+    print(f"Time in Python callbacks: {callbacks_df['total_ms'].sum():.0f} ms")
+    print('\nConstraint matches:')
+    print(match_totals.to_string(index=False))
+    print('\nPer constraint callbacks:')
+    print(callbacks_df.groupby('constraint')[['calls', 'total_ms']].sum()
+          .sort_values('total_ms', ascending=False).to_string())
+    print('\nPer callback:')
+    print(callbacks_df.to_string(index=False))
+
+
+def profile_toggles(problem, seconds):
+    # All constraints once, then one solve with each constraint left out.
+    # The speed gained by dropping a constraint is roughly what it costs.
+    constraint_names = [constraint.__name__ for constraint in get_constraints()]
+    records = []
+    for disabled in [None] + constraint_names:
+        enabled = [name for name in constraint_names if name != disabled]
+        solution, statistics, _ = solve(problem, build_constraint_provider(enabled), seconds)
+        records.append({'disabled': disabled or '-', 'score': str(solution.get_score()), **statistics})
+
+    df = pd.DataFrame(records)
+    baseline_speed = df.loc[0, 'score_calculation_speed']
+    df['speedup'] = df['score_calculation_speed'] / max(baseline_speed, 1)
+    print(df.to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Where does score calculation time go, per constraint')
+    parser.add_argument('--data-path', default=RESULT_DATA_PATH)
+    parser.add_argument('--mode', choices=['callbacks', 'toggle'], default='callbacks')
+    parser.add_argument('--seconds', type=int, default=10)
+    args = parser.parse_args()
+
+    problem = DataManager(args.data_path).generate_optapy_problem()
+    if args.mode == 'callbacks':
+        profile_callbacks(problem, args.seconds)
+    else:
+        profile_toggles(problem, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
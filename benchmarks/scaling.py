@@ -0,0 +1,117 @@
+import os
+import time
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.synthetic import generate_instance, save_instance, scaled_instance_size
+from utils.termination import TERMINATION_POLICIES
+
+
+def run_instance(scale, seconds, seed, termination_name, partitioned_workers=None, independent_programs=False):
+    # Runs in its own process so peak RSS and the JVM belong to this size only
+    from optapy import solver_factory_create
+    from utils.data import DataManager
+    from utils.feasibility import analyze_feasibility
+    from utils.constraints import get_solver_config
+    from utils.profiling import get_solver_statistics
+    from utils.termination import get_termination_policy
+    from utils.partition import solve_partitioned
+    from utils.solvers import get_solver_registry
+
+    size = scaled_instance_size(scale)
+    with tempfile.TemporaryDirectory() as data_path:
+        save_instance(generate_instance(**size, independent_programs=independent_programs, seed=seed), data_path)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        data_manager = DataManager(data_path, use_cache=False)
+        preprocessing_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        issues = analyze_feasibility(data_manager)
+        feasibility_ms = int((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        problem = data_manager.generate_optapy_problem()
+        build_s = time.perf_counter() - start
+        _, python_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    termination = get_termination_policy(termination_name, len(problem.lesson_list), seconds)
+    first_feasible = []
+    if partitioned_workers:
+        # Parts are solved in their own processes, so only the wall clock and final score are known here
+        start = time.perf_counter()
+        solution, _, unresolved = solve_partitioned(problem, termination, partitioned_workers)
+        solve_ms = int((time.perf_counter() - start) * 1000)
+        score = get_solver_registry().score_manager().updateScore(solution)
+        stopped_by = f'partitioned, {len(unresolved)} room clashes left'
+    else:
+        def on_best_solution(event):
+            if not first_feasible and event.getNewBestScore().isFeasible():
+                first_feasible.append(event.getTimeMillisSpent())
+
+        solver = solver_factory_create(get_solver_config(termination=termination)).buildSolver()
+        solver.addEventListener(on_best_solution)
+        solution = solver.solve(problem)
+        statistics = get_solver_statistics(solver)
+        score = solution.get_score()
+        solve_ms = statistics['time_spent_ms']
+        stopped_by = termination.termination_reason(score, statistics['time_spent_ms'], statistics['best_solution_time_ms'])
+
+    return {
+        'scale': scale,
+        **size,
+        'lessons': len(problem.lesson_list),
+        'group_conflicts': len(problem.group_conflict_list),
+        'preprocessing_s': round(preprocessing_s, 3),
+        'feasibility_ms': feasibility_ms,
+        'provable_issues': len(issues),
+        'build_s': round(build_s, 3),
+        'first_feasible_ms': first_feasible[0] if first_feasible else None,
+        'final_score': str(score),
+        'solve_ms': solve_ms,
+        'stopped_by': stopped_by,
+        'python_peak_mb': round(python_peak / 2 ** 20, 1),
+        # ru_maxrss is in KB on Linux, includes the JVM heap
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocessing, build and solve metrics on synthetic instances')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--termination', choices=list(TERMINATION_POLICIES), default='adaptive')
+    parser.add_argument('--seconds', type=int, default=None,
+                        help='Hard cap on solving time per instance, by default scaled with the lesson count')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--partitioned', type=int, default=None, metavar='WORKERS',
+                        help='Solve independent lesson components in this many processes')
+    parser.add_argument('--independent-programs', action='store_true',
+                        help='Generate programs that share no subjects or teachers')
+    parser.add_argument('--output', default=None, help='Optional CSV path for the results')
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for scale in args.scales:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_instance, scale, args.seconds, args.seed, args.termination, args.partitioned,
+                                     args.independent_programs).result()
+        print(result)
+        results.append(result)
+
+    results_df = pd.DataFrame(results)
+    print(results_df.to_string(index=False))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        results_df.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import copy
+import time
+import argparse
+import pandas as pd
+
+from utils.data import DataManager
+
+RESULT_DATA_PATH = 'new_schedule/input'
+
+
+def legacy_student_group_list(lesson_list):
+    # TimeTable.get_student_group_list before the collection was built once with the problem
+    covered_group_ids = []
+    group_list = []
+    for lesson in lesson_list:
+        if lesson.student_group.id not in covered_group_ids:
+            group_list.append(lesson.student_group)
+            covered_group_ids.append(lesson.student_group.id)
+    return group_list
+
+
+def scale_problem(data_manager, factor):
+    # factor copies of every lesson, each copy taught to its own copy of the student groups
+    base_lessons_df = data_manager.input_lessons_df
+    base_groups = list(data_manager.group_to_pupils.items())
+    id_offset = len(data_manager.group_intersections)
+
+    lessons_copies = [base_lessons_df]
+    for copy_num in range(1, factor):
+        lessons_df = base_lessons_df.copy()
+        lessons_df['group'] = lessons_df['group'] + f' #{copy_num}'
+        lessons_copies.append(lessons_df)
+        for group_name, pupils in base_groups:
+            data_manager.group_to_pupils[f'{group_name} #{copy_num}'] = pupils
+            data_manager.group_to_id[f'{group_name} #{copy_num}'] = id_offset * copy_num + data_manager.group_to_id[group_name]
+
+    lessons_df = pd.concat(lessons_copies, ignore_index=True)
+    lessons_df['id'] = range(lessons_df.shape[0])
+    data_manager.input_lessons_df = lessons_df
+
+
+def clone_solution(solution, student_group_list_getter):
+    # Python side of a planning clone: new solution, new entities, fact collections read again
+    clone = copy.copy(solution)
+    clone.lesson_list = [copy.copy(lesson) for lesson in solution.lesson_list]
+    student_group_list_getter(clone)
+    return clone
+
+
+def time_per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solution cloning cost with the legacy and the prebuilt student group collection')
+    parser.add_argument('--data-path', default=RESULT_DATA_PATH)
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lessons':>8} {'groups':>7} | {'groups legacy ms':>16} {'groups now ms':>14} | "
+          f"{'clone legacy ms':>15} {'clone now ms':>13} {'speedup':>8}")
+    for factor in args.factors:
+        data_manager = DataManager(args.data_path)
+        scale_problem(data_manager, factor)
+        problem = data_manager.generate_optapy_problem()
+
+        groups_legacy = time_per_call(lambda: legacy_student_group_list(problem.lesson_list), args.repeat)
+        groups_current = time_per_call(problem.get_student_group_list, args.repeat)
+        clone_legacy = time_per_call(lambda: clone_solution(problem, lambda s: legacy_student_group_list(s.lesson_list)), args.repeat)
+        clone_current = time_per_call(lambda: clone_solution(problem, lambda s: s.get_student_group_list()), args.repeat)
+        print(f"{len(problem.lesson_list):>8} {len(problem.student_group_list):>7} | "
+              f"{groups_legacy * 1000:>16.3f} {groups_current * 1000:>14.3f} | "
+              f"{clone_legacy * 1000:>15.2f} {clone_current * 1000:>13.2f} {clone_legacy / clone_current:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+from time import perf_counter
+
+
+def timed(function):
+    start = perf_counter()
+    result = function()
+    return result, perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold vs warm solver build cost with and without the solver registry')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Starts the JVM and generates the Java classes for the planning entities
+    _, import_s = timed(lambda: __import__('utils.constraints'))
+    from optapy import solver_factory_create, score_manager_create
+    from utils.constraints import get_solver_config
+    from utils.solvers import SolverRegistry
+
+    registry = SolverRegistry()
+    _, cold_s = timed(lambda: registry.solver_factory().buildSolver())
+    _, cold_score_manager_s = timed(lambda: registry.score_manager())
+
+    rows = []
+    for _ in range(args.repeat):
+        _, uncached_s = timed(lambda: solver_factory_create(get_solver_config()).buildSolver())
+        _, uncached_score_manager_s = timed(lambda: score_manager_create(solver_factory_create(get_solver_config())))
+        _, warm_s = timed(lambda: registry.solver_factory().buildSolver())
+        _, warm_score_manager_s = timed(lambda: registry.score_manager())
+        rows.append((uncached_s, uncached_score_manager_s, warm_s, warm_score_manager_s))
+
+    def mean_ms(column):
+        return sum(row[column] for row in rows) / len(rows) * 1000
+
+    print(f'JVM start and entity classes: {import_s * 1000:.1f} ms')
+    print(f'First solver build (cold):    {cold_s * 1000:.1f} ms')
+    print(f'First score manager (cold):   {cold_score_manager_s * 1000:.1f} ms')
+    print(f'\nMean over {args.repeat} later builds:')
+    print(f'Solver, new factory each time:        {mean_ms(0):.1f} ms')
+    print(f'Score manager, new factory each time: {mean_ms(1):.1f} ms')
+    print(f'Solver, registry factory:             {mean_ms(2):.1f} ms')
+    print(f'Score manager, registry:              {mean_ms(3):.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
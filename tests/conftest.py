@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+SAMPLE_DATA_PATH = os.path.join(REPO_ROOT, 'new_schedule', 'input')
+
+
+@pytest.fixture(scope='session')
+def data_manager():
+    from utils.data import DataManager
+    return DataManager(SAMPLE_DATA_PATH, use_cache=False)
+
+
+@pytest.fixture(scope='session')
+def problem(data_manager):
+    return data_manager.generate_optapy_problem()
+
+
+@pytest.fixture(scope='session')
+def raw_schedule_df(data_manager):
+    # The sample lessons spread over the week and rooms in id order, parsed like a solved schedule
+    from utils.schedule import ScheduleManager
+    solution = data_manager.generate_optapy_problem()
+    lessons = sorted(solution.get_lesson_list(), key=lambda lesson: lesson.id)
+    for num, lesson in enumerate(lessons):
+        lesson.timeslot = solution.timeslot_list[num % len(solution.timeslot_list)]
+        lesson.room = solution.room_list[num % len(solution.room_list)]
+    return ScheduleManager(optapy_solution=solution).raw_schedule_df
@@ -0,0 +1,48 @@
+import shutil
+import pandas as pd
+import pytest
+
+from batch_solve import expand_inputs, output_names, solve_input, STATUS_INFEASIBLE_INPUT
+from conftest import SAMPLE_DATA_PATH
+from utils.synthetic import generate_instance, save_instance_workbook, scaled_instance_size
+
+
+@pytest.fixture
+def inputs_dir(tmp_path):
+    shutil.copytree(SAMPLE_DATA_PATH, tmp_path / 'autumn')
+    save_instance_workbook(generate_instance(**scaled_instance_size(0.2)), tmp_path / 'spring.xlsx')
+    (tmp_path / 'notes').mkdir()
+    (tmp_path / '~$spring.xlsx').write_bytes(b'')
+    return tmp_path
+
+
+def test_expand_inputs(inputs_dir):
+    assert expand_inputs([str(inputs_dir)]) == [str(inputs_dir / 'autumn'), str(inputs_dir / 'spring.xlsx')]
+    assert expand_inputs([str(inputs_dir / 'autumn'), str(inputs_dir / 'spring.xlsx')]) == \
+        [str(inputs_dir / 'autumn'), str(inputs_dir / 'spring.xlsx')]
+    with pytest.raises(ValueError):
+        expand_inputs([str(inputs_dir / 'missing.xlsx')])
+
+
+def test_output_names_are_unique():
+    assert output_names(['a/input', 'b/input/', 'c/input.xlsx', 'd/other.xlsx']) == ['input', 'input-2', 'input-3', 'other']
+
+
+def test_infeasible_input_is_reported_without_solving(tmp_path):
+    input_path = tmp_path / 'input'
+    shutil.copytree(SAMPLE_DATA_PATH, input_path)
+    lessons_df = pd.read_csv(input_path / 'lessons.csv')
+    lessons_df.loc[0, 'teacher'] = 'Nobody Known'
+    lessons_df.to_csv(input_path / 'lessons.csv', index=False)
+    audiences_df = pd.read_csv(input_path / 'audiences.csv')
+    audiences_df['capacity'] = 1
+    audiences_df.to_csv(input_path / 'audiences.csv', index=False)
+
+    result = solve_input(str(input_path), str(tmp_path / 'output'), 'adaptive', None, True, False)
+    assert result['status'] == STATUS_INFEASIBLE_INPUT
+    assert result['feasibility_warnings'] == 1
+    assert result['provable_issues'] > 0
+    assert 'solve_s' not in result['timings']
+    issues_df = pd.read_csv(tmp_path / 'output' / 'feasibility_issues.csv')
+    assert 'no room fits' in set(issues_df.loc[issues_df['blocking'], 'check'])
+    assert issues_df.loc[~issues_df['blocking'], 'check'].tolist() == ['unknown teacher']
@@ -0,0 +1,45 @@
+import pytest
+
+from utils.data import DataManager
+from utils.files import read_uploaded_workbook
+from utils.preprocessing import get_group_columns
+from utils.synthetic import generate_instance, save_instance, save_instance_workbook, scaled_instance_size
+
+
+@pytest.fixture
+def numeric_group_frames():
+    # The synthetic instance with every group renamed to a number
+    frames = generate_instance(**scaled_instance_size(0.3))
+    numbers = {name: 100 + num for num, name in enumerate(frames['groups']['name'])}
+    frames['groups']['name'] = frames['groups']['name'].map(numbers)
+    frames['lessons']['group'] = frames['lessons']['group'].map(numbers)
+    students_df = frames['students']
+    for column in get_group_columns(students_df):
+        # Nullable ints, so the CSVs hold 101 rather than 101.0 like an exported sheet would
+        students_df[column] = students_df[column].map(numbers).astype('Int64')
+    return frames
+
+
+def test_numeric_group_names_read_the_same_from_a_workbook_and_csvs(numeric_group_frames, tmp_path):
+    save_instance_workbook(numeric_group_frames, tmp_path / 'input.xlsx')
+    with open(tmp_path / 'input.xlsx', 'rb') as f:
+        from_workbook = DataManager(workbook=read_uploaded_workbook(f), use_cache=False)
+    save_instance(numeric_group_frames, tmp_path / 'csv')
+    from_csv = DataManager(str(tmp_path / 'csv'), use_cache=False)
+
+    assert from_workbook.group_to_pupils == from_csv.group_to_pupils
+    assert all(isinstance(name, str) and name.isdigit() for name in from_workbook.group_to_pupils)
+    assert from_workbook.input_lessons_df.shape[0] == from_csv.input_lessons_df.shape[0] > 0
+    assert len(from_workbook.generate_optapy_problem().lesson_list) == from_workbook.input_lessons_df.shape[0]
+
+
+def test_rescheduled_lesson_is_matched_by_lesson_id(data_manager):
+    lessons_df = data_manager.input_lessons_df
+    scheduled = lessons_df[lessons_df['student_group_capacity'].notna()]
+    # A lesson whose id is not its position, so matching by position would pick another one
+    lesson_id = next(int(lesson_id) for num, lesson_id in enumerate(lessons_df['id'])
+                     if lesson_id != num and lesson_id in set(scheduled['id']))
+    problem = data_manager.generate_optapy_problem(reschedule_lesson_id=lesson_id, forbidden_time_slots={3: 1, 4: 0})
+    assert [(forbidden.lesson_id, forbidden.timeslot_id) for forbidden in problem.forbidden_timeslot_list] == [(lesson_id, 3)]
+    lesson = next(lesson for lesson in problem.lesson_list if lesson.id == lesson_id)
+    assert not lesson.is_fixed
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from conftest import SAMPLE_DATA_PATH
+from utils.cache import INPUT_FILES
+from utils.data import DataManager
+from utils.feasibility import analyze_feasibility, blocking_issues, issues_to_frame
+from utils.files import UploadedWorkbook
+
+
+@pytest.fixture
+def frames():
+    return {name[:-len('.csv')]: pd.read_csv(f'{SAMPLE_DATA_PATH}/{name}') for name in INPUT_FILES}
+
+
+def analyze(frames):
+    data_manager = DataManager(workbook=UploadedWorkbook('test', frames), use_cache=False)
+    issues = analyze_feasibility(data_manager)
+    return data_manager, {issue.check for issue in issues}, issues
+
+
+def test_sample_data_has_no_provable_conflicts(data_manager):
+    assert analyze_feasibility(data_manager) == []
+    assert issues_to_frame([]).columns.tolist() == ['check', 'name', 'message', 'lesson_ids', 'blocking']
+
+
+def test_unknown_teacher(frames):
+    frames['lessons'].loc[0, 'teacher'] = 'Nobody Known'
+    _, checks, issues = analyze(frames)
+    assert checks == {'unknown teacher'}
+    assert issues[0].name == 'Nobody Known'
+    # Its lessons are only skipped, nothing stops solving the rest
+    assert blocking_issues(issues) == []
+
+
+def test_teacher_overloaded(frames):
+    teachers_df = frames['teachers'].astype(object)
+    frames['teachers'] = teachers_df
+    busiest = frames['lessons'].groupby('teacher')['count'].sum().idxmax()
+    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+    teachers_df.loc[teachers_df['name'].str.strip() == busiest, days] = ['08:30-09:50', 0, 0, 0, 0]
+    data_manager, checks, issues = analyze(frames)
+    assert 'teacher overloaded' in checks
+    overloaded = next(issue for issue in issues if issue.check == 'teacher overloaded')
+    lessons_df = data_manager.input_lessons_df
+    assert set(lessons_df.loc[lessons_df['id'].isin(overloaded.lesson_ids), 'teacher']) == {busiest}
+
+
+def test_group_overloaded(frames):
+    frames['lessons'].loc[0, 'count'] = 31
+    _, checks, issues = analyze(frames)
+    assert 'group overloaded' in checks
+    assert len(next(issue for issue in issues if issue.check == 'group overloaded').lesson_ids) > 30
+
+
+def test_no_room_fits(frames):
+    frames['audiences']['capacity'] = 1
+    _, checks, _ = analyze(frames)
+    assert 'no room fits' in checks
+
+
+def test_not_enough_rooms_reports_every_capacity_tier(frames, data_manager):
+    # A single room big enough for every group, so each group size with more than a week of lessons fails
+    audiences_df = frames['audiences']
+    audiences_df = audiences_df[audiences_df['is_shelter_id'].notna()].head(1).copy()
+    audiences_df['capacity'] = int(data_manager.input_lessons_df['student_group_capacity'].max())
+    frames['audiences'] = audiences_df
+    _, checks, issues = analyze(frames)
+    assert 'no room fits' not in checks
+    tiers = [issue for issue in issues if issue.check == 'not enough rooms']
+    assert len(tiers) > 1
+    assert all(issue.blocking for issue in tiers)
+
+
+def test_student_overloaded_across_groups(frames, data_manager):
+    # Two groups sharing a student, each fitting into the week on its own but not together
+    scheduled = data_manager.input_lessons_df
+    scheduled = scheduled[scheduled['student_group_capacity'] > 0]
+    lessons_df = frames['lessons']
+    rows_of = {
+        group: lessons_df.index[(lessons_df['group'].str.strip() == group) & (lessons_df['format'] == 'офлайн')
+                                & lessons_df['subject'].str.strip().isin(scheduled.loc[scheduled['group'] == group, 'subject'])]
+        for group in scheduled['group'].unique()
+    }
+    rows, cols, _ = data_manager.group_intersections.pairs()
+    names = data_manager.group_intersections.group_names
+    group_a, group_b = next((names[a], names[b]) for a, b in zip(rows, cols)
+                            if len(rows_of.get(names[a], [])) and len(rows_of.get(names[b], [])))
+    for group in [group_a, group_b]:
+        lessons_df.loc[lessons_df['group'].str.strip() == group, 'count'] = 0
+        lessons_df.loc[rows_of[group][0], 'count'] = 16
+    _, checks, _ = analyze(frames)
+    assert 'student overloaded' in checks
+    assert 'group overloaded' not in checks
@@ -0,0 +1,56 @@
+import io
+import openpyxl
+import pandas as pd
+
+from utils.explanation import ScoreReport
+from utils.files import write_schedule_workbook, schedule_csv_files, read_workbook_frames, _sheet_title, MAX_SHEET_TITLE_LENGTH
+from utils.schedule import ScheduleManager
+
+
+def test_sheet_titles_are_short_valid_and_unique():
+    used_titles = set()
+    long_name = 'Room 1002_ASTEM FOUNDATION Classroom [70]'
+    first = _sheet_title(long_name, used_titles)
+    second = _sheet_title(long_name, used_titles)
+    assert len(first) <= MAX_SHEET_TITLE_LENGTH and len(second) <= MAX_SHEET_TITLE_LENGTH
+    assert not set('[]:*?/\\') & set(first)
+    assert first != second and second.endswith('(2)')
+    assert _sheet_title(first.upper(), used_titles).endswith('(3)')
+
+
+def test_workbook_has_the_raw_schedule_and_a_sheet_per_room_teacher_and_group(raw_schedule_df):
+    schedule_manager = ScheduleManager(raw_schedule_df=raw_schedule_df)
+    output = write_schedule_workbook(schedule_manager)
+    content = output.read()
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+    titles = workbook.sheetnames
+    workbook.close()
+    assert titles[0] == 'Raw schedule'
+    expected = 1 + sum(raw_schedule_df[column].nunique() for column in ['room', 'teacher', 'student_group'])
+    assert len(titles) == expected == len({title.lower() for title in titles})
+
+    frames = read_workbook_frames(content)
+    assert frames['Raw schedule']['lesson_id'].tolist() == raw_schedule_df['lesson_id'].tolist()
+    # Weekly grids per entity in name order, holding each of its lessons
+    teacher = sorted(raw_schedule_df['teacher'].unique())[0]
+    grid = frames[next(title for title in titles if title.startswith('Teacher'))]
+    assert grid.columns.tolist() == ['start_time', 'MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY']
+    cells = '\n\n'.join(grid.drop(columns='start_time').fillna('').astype(str).values.ravel())
+    for schedule_id in raw_schedule_df.loc[raw_schedule_df['teacher'] == teacher, 'schedule_id']:
+        assert f'[{schedule_id}]' in cells
+
+
+def test_schedule_csv_files(raw_schedule_df):
+    schedule_manager = ScheduleManager(raw_schedule_df=raw_schedule_df)
+    conflicts = pd.DataFrame({'constraint': ['Room conflict'], 'score': ['-1hard/0medium/0soft'],
+                              'lesson_id': [1], 'other_lesson_id': pd.array([2], dtype='Int64')})
+    totals = pd.DataFrame({'constraint': ['Room conflict'], 'match_count': [1], 'score': ['-1hard/0medium/0soft']})
+    schedule_manager.score_report = ScoreReport('-1hard/0medium/0soft', totals, conflicts)
+
+    files = schedule_csv_files(schedule_manager)
+    assert sorted(files) == sorted(['raw_schedule.csv', 'pretty_schedule.csv', 'teacher_schedule.csv', 'group_schedule.csv',
+                                    'constraint_totals.csv', 'conflicts.csv', 'indictments.csv'])
+    assert pd.read_csv(io.StringIO(files['raw_schedule.csv'])).shape[0] == raw_schedule_df.shape[0]
+    indictments = pd.read_csv(io.StringIO(files['indictments.csv']))
+    assert sorted(indictments['lesson_id'].tolist()) == [1, 2]
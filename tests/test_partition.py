@@ -0,0 +1,51 @@
+import numpy as np
+
+from utils.partition import find_lesson_components, group_components, split_problem, repair_rooms
+
+
+def test_lessons_sharing_a_teacher_or_group_are_in_one_component(problem):
+    labels = find_lesson_components(problem)
+    assert len(labels) == len(problem.lesson_list)
+    assert set(labels.tolist()) == set(range(labels.max() + 1))
+    for attribute in ['teacher', 'student_group']:
+        component_of = {}
+        for lesson, label in zip(problem.lesson_list, labels):
+            assert component_of.setdefault(getattr(lesson, attribute).id, label) == label
+
+
+def test_group_components_keeps_components_whole_and_balances_parts():
+    labels = np.array([0, 0, 0, 0, 1, 1, 2, 2, 3])
+    parts = group_components(labels, 2)
+    assert set(parts.tolist()) == {0, 1}
+    for label in np.unique(labels):
+        assert len(set(parts[labels == label].tolist())) == 1
+    assert sorted(np.bincount(parts).tolist()) == [4, 5]
+    # Never more parts than components
+    assert group_components(labels, 10).max() == 3
+
+
+def test_split_problem_covers_every_lesson_once(problem):
+    parts = split_problem(problem, group_components(find_lesson_components(problem), 3))
+    lesson_ids = [lesson.id for part in parts for lesson in part.lesson_list]
+    assert sorted(lesson_ids) == sorted(lesson.id for lesson in problem.lesson_list)
+    for part in parts:
+        group_ids = {group.id for group in part.student_group_list}
+        assert {lesson.student_group.id for lesson in part.lesson_list} == group_ids
+        assert all(conflict.group_id in group_ids and conflict.other_group_id in group_ids
+                   for conflict in part.group_conflict_list)
+
+
+def test_repair_rooms_moves_clashing_lessons_to_a_free_room(data_manager):
+    problem = data_manager.generate_optapy_problem()
+    timeslot = problem.timeslot_list[0]
+    room = max(problem.room_list, key=lambda room: room.capacity)
+    clashing = sorted(problem.lesson_list, key=lambda lesson: lesson.student_group_capacity)[:3]
+    for lesson in clashing:
+        lesson.set_timeslot(timeslot)
+        lesson.set_room(room)
+
+    unresolved = repair_rooms(problem)
+    assert unresolved == []
+    rooms = [lesson.room.id for lesson in clashing]
+    assert len(set(rooms)) == len(clashing)
+    assert all(lesson.room.capacity >= lesson.student_group_capacity for lesson in clashing)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from utils.preprocessing import (
+    strip_whitespace, get_group_columns, build_group_incidence, get_enrollment_counts, get_group_intersections,
+)
+
+
+def students_frame():
+    return pd.DataFrame({
+        'Прізвище': ['A', 'B', 'C', 'D'],
+        "Ім'я": ['a', 'b', 'c', 'd'],
+        'Спеціальність': ['P0', 'P0', 'P1', 'P1'],
+        'Math': ['M1', 'M1', 'M2', np.nan],
+        'Math.1': ['M1 (P)', np.nan, 'M2 (P)', np.nan],
+        'Art': [np.nan, 'X', 'X', 'X'],
+    })
+
+
+def test_strip_whitespace():
+    assert strip_whitespace('  group ') == 'group'
+    assert strip_whitespace(3) == 3
+
+
+def test_incidence_and_enrollment_counts():
+    students_df = students_frame()
+    assert get_group_columns(students_df) == ['Math', 'Math.1', 'Art']
+    incidence, group_names = build_group_incidence(students_df)
+    assert incidence.shape == (4, len(group_names))
+    assert dict(zip(group_names, np.asarray(incidence.sum(axis=0)).ravel().tolist())) == {
+        'M1': 2, 'M2': 1, 'M1 (P)': 1, 'M2 (P)': 1, 'X': 3}
+    counts = get_enrollment_counts(students_df)
+    assert counts[('Art', 'X')] == 3
+    assert counts[('Math', 'M1')] == 2
+
+
+def test_group_intersections_count_shared_students():
+    intersections = get_group_intersections(students_frame())
+    assert intersections.shared_count('M1', 'X') == 1
+    assert intersections.shared_count('M2', 'X') == 1
+    assert intersections.shared_count('M1', 'M2') == 0
+    assert intersections.intersects('M2', 'M2 (P)')
+    # A group does not intersect itself and unknown groups intersect nothing
+    assert intersections.shared_count('X', 'X') == 0
+    assert not intersections.intersects('X', 'Physics')
+
+    x = intersections.group_index['X']
+    assert sorted(intersections.group_names[num] for num in intersections.neighbours(x)) == ['M1', 'M2', 'M2 (P)']
+    assert intersections.to_dict()['M1'] == {'M1 (P)': 1, 'X': 1}
+
+
+def test_pairs_lists_each_intersection_once():
+    intersections = get_group_intersections(students_frame())
+    rows, cols, shared = intersections.pairs()
+    assert (rows < cols).all()
+    assert len(rows) == sum(len(intersections.neighbours(num)) for num in range(len(intersections))) // 2
+
+
+def test_neighbours_of_groups_outside_the_matrix_are_empty(data_manager):
+    intersections = data_manager.group_intersections
+    assert len(intersections.neighbours(len(intersections))) == 0
+    assert len(intersections.neighbours(10 * len(intersections))) == 0
+    assert len(intersections.neighbours(-1)) == 0
+
+
+def test_sample_intersections_are_symmetric(data_manager):
+    shared = data_manager.group_intersections.shared_students
+    assert (shared != shared.T).nnz == 0
+    assert shared.diagonal().sum() == 0
+
+
+def test_problem_with_groups_added_after_preprocessing():
+    # benchmarks/solution_cloning.py scales the lessons with group copies outside the intersection matrix
+    from benchmarks.solution_cloning import scale_problem
+    from utils.data import DataManager
+    from conftest import SAMPLE_DATA_PATH
+
+    data_manager = DataManager(SAMPLE_DATA_PATH, use_cache=False)
+    lesson_count = len(data_manager.generate_optapy_problem().lesson_list)
+    scale_problem(data_manager, 2)
+    assert len(data_manager.generate_optapy_problem().lesson_list) == 2 * lesson_count
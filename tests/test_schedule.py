@@ -0,0 +1,36 @@
+from utils.schedule import ScheduleManager
+
+
+def test_parsed_schedule_matches_the_lessons(data_manager):
+    solution = data_manager.generate_optapy_problem()
+    for num, lesson in enumerate(solution.lesson_list):
+        lesson.timeslot = solution.timeslot_list[num % len(solution.timeslot_list)]
+        lesson.room = solution.room_list[-1 - num % len(solution.room_list)]
+    raw_schedule_df = ScheduleManager(optapy_solution=solution).raw_schedule_df
+
+    assert raw_schedule_df['lesson_id'].is_monotonic_increasing
+    lessons = {lesson.id: lesson for lesson in solution.lesson_list}
+    for row in raw_schedule_df.itertuples():
+        lesson = lessons[row.lesson_id]
+        assert (row.time_slot_id, row.room_id, row.subject) == (lesson.timeslot.id, lesson.room.id, lesson.subject)
+        assert (row.student_group, row.day) == (lesson.student_group.name, lesson.timeslot.day_of_week)
+
+
+def test_pretty_schedule_leaves_the_raw_schedule_alone(raw_schedule_df):
+    raw_schedule_df = raw_schedule_df.drop(columns='text')
+    pretty_df = ScheduleManager(raw_schedule_df=raw_schedule_df).raw_schedule_to_pretty(raw_schedule_df)
+    assert 'text' not in raw_schedule_df
+    assert not pretty_df.empty
+
+
+def test_views_follow_a_schedule_edited_in_place(raw_schedule_df):
+    raw_schedule_df = raw_schedule_df.copy()
+    schedule_manager = ScheduleManager(raw_schedule_df=raw_schedule_df)
+    row = raw_schedule_df.iloc[0]
+    timetable = schedule_manager.timetable('teacher', row['teacher'])
+    assert f"[{row['schedule_id']}]" in timetable.loc[timetable['start_time'] == row['start_time'], row['day']].item()
+
+    other_day = next(day for day in ['MONDAY', 'TUESDAY'] if day != row['day'])
+    raw_schedule_df.loc[raw_schedule_df.index[0], 'day'] = other_day
+    timetable = schedule_manager.timetable('teacher', row['teacher'])
+    assert f"[{row['schedule_id']}]" in timetable.loc[timetable['start_time'] == row['start_time'], other_day].item()
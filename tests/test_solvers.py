@@ -0,0 +1,78 @@
+import pytest
+
+import utils.solvers
+from utils.jobs import SolveJobManager, JOB_FINISHED
+from utils.solvers import SolverRegistry, MAX_SOLVER_MANAGERS
+from utils.termination import fixed_policy, TERMINATION_SPENT
+
+
+class FakeSolution:
+    def get_score(self):
+        return '0hard/0medium/0soft'
+
+
+class FakeDuration:
+    def __init__(self, millis):
+        self.millis = millis
+
+    def toMillis(self):
+        return self.millis
+
+
+class FakeSolverJob:
+    def getSolvingDuration(self):
+        return FakeDuration(1000)
+
+
+class FakeSolverManager:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+        self.final_best_solution_consumers = []
+
+    def solveAndListen(self, problem_id, problem, best_solution_consumer, final_best_solution_consumer, exception_handler):
+        self.final_best_solution_consumers.append(final_best_solution_consumer)
+        return FakeSolverJob()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Same signature as the real get_solver_config, so registry keys are built the same way
+    def get_solver_config(constraint_provider_function=None, solving_duration=10, termination=None):
+        return termination
+    monkeypatch.setattr(utils.solvers, 'get_solver_config', get_solver_config)
+    monkeypatch.setattr(utils.solvers, 'solver_manager_create', FakeSolverManager)
+    return SolverRegistry()
+
+
+def test_idle_solver_managers_are_closed_least_recently_used_first(registry):
+    managers = []
+    for seconds in range(1, MAX_SOLVER_MANAGERS + 3):
+        managers.append(registry.solver_manager(termination=fixed_policy(seconds=seconds)))
+        registry.release_solver_manager(termination=fixed_policy(seconds=seconds))
+    assert len(registry.solver_managers) == MAX_SOLVER_MANAGERS
+    assert [manager.closed for manager in managers] == [True, True] + [False] * MAX_SOLVER_MANAGERS
+    # A cached policy is reused rather than rebuilt
+    assert registry.solver_manager(termination=fixed_policy(seconds=3)) is managers[2]
+
+
+def test_solver_managers_with_running_jobs_stay_open(registry):
+    job_manager = SolveJobManager(registry)
+    job_id = job_manager.submit(problem=None, termination=fixed_policy(seconds=1))
+    running = registry.solver_managers[registry.config_key({'termination': fixed_policy(seconds=1)})]
+    for seconds in range(2, MAX_SOLVER_MANAGERS + 4):
+        registry.solver_manager(termination=fixed_policy(seconds=seconds))
+        registry.release_solver_manager(termination=fixed_policy(seconds=seconds))
+    assert not running.closed
+
+    running.final_best_solution_consumers[0](FakeSolution())
+    job = job_manager.get(job_id)
+    assert job.status == JOB_FINISHED
+    # Timed by the solver, however long the job waited before and after
+    assert job.time_spent_ms == 1000 and job.termination_reason == TERMINATION_SPENT
+    registry.solver_manager(termination=fixed_policy(seconds=100))
+    assert running.closed
+    assert len(registry.solver_managers) == MAX_SOLVER_MANAGERS
@@ -0,0 +1,121 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from utils.schedule import group_pairs_frame
+from utils.store import ScheduleStore, VERSION_EDIT
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ScheduleStore(str(tmp_path / 'schedules.sqlite'))
+
+
+def expected_conflicts(raw_schedule_df, column):
+    # Lesson pairs sharing a timeslot and column, counted with pandas
+    sizes = raw_schedule_df.groupby(['time_slot_id', column]).size()
+    return int((sizes * (sizes - 1) // 2).sum())
+
+
+def test_save_and_load_round_trip(store, raw_schedule_df):
+    version_id = store.save(raw_schedule_df, score='0hard/0medium/0soft')
+    loaded = store.load(version_id)
+    assert loaded['lesson_id'].tolist() == raw_schedule_df['lesson_id'].tolist()
+    assert loaded['time_slot_id'].tolist() == raw_schedule_df['time_slot_id'].tolist()
+    assert loaded['text'].tolist() == raw_schedule_df['text'].tolist()
+
+    versions = store.versions()
+    assert versions['id'].tolist() == [version_id]
+    assert versions['lessons'].tolist() == [len(raw_schedule_df)]
+
+
+def expected_student_conflicts(raw_schedule_df, group_pairs_df):
+    # Lesson pairs in one timeslot whose groups are a stored pair
+    lessons_df = raw_schedule_df[['time_slot_id', 'student_group', 'lesson_id']]
+    pairs_df = group_pairs_df.merge(lessons_df, on='student_group').merge(
+        lessons_df.rename(columns={'student_group': 'other_group', 'lesson_id': 'other_lesson_id'}), on=['other_group', 'time_slot_id'])
+    return pairs_df.shape[0]
+
+
+def test_conflicts_match_pandas(store, raw_schedule_df, data_manager):
+    group_pairs_df = data_manager.group_intersections.to_frame()
+    version_id = store.save(raw_schedule_df, group_pairs_df=group_pairs_df)
+    conflicts = store.conflicts(version_id)
+    for kind, column in [('room', 'room_id'), ('teacher', 'teacher'), ('group', 'student_group')]:
+        assert (conflicts['conflict'] == kind).sum() == expected_conflicts(raw_schedule_df, column)
+    student_conflicts = (conflicts['conflict'] == 'students').sum()
+    assert student_conflicts == expected_student_conflicts(raw_schedule_df, group_pairs_df) > 0
+    assert (conflicts['lesson_id'] < conflicts['other_lesson_id']).all()
+
+    # Every lesson's own conflicts are exactly the rows it is in, found from either side
+    for lesson_id in conflicts[['lesson_id', 'other_lesson_id']].stack().unique()[:20].tolist():
+        own = store.conflicts(version_id, lesson_id=lesson_id)
+        involved = conflicts[(conflicts['lesson_id'] == lesson_id) | (conflicts['other_lesson_id'] == lesson_id)]
+        assert own.values.tolist() == involved.values.tolist()
+
+
+def test_group_pairs_are_the_solvers(store, problem, raw_schedule_df, data_manager):
+    # The pairs the solver's student conflict joins through, kept for the groups with lessons
+    solver_pairs = group_pairs_frame(problem)
+    version_id = store.save(raw_schedule_df, group_pairs_df=solver_pairs)
+    groups = set(raw_schedule_df['student_group'])
+    all_pairs = data_manager.group_intersections.to_frame()
+    all_pairs = all_pairs[all_pairs['student_group'].isin(groups) & all_pairs['other_group'].isin(groups)]
+    assert sorted(map(tuple, solver_pairs.values.tolist())) == sorted(map(tuple, all_pairs.values.tolist()))
+    assert (store.conflicts(version_id)['conflict'] == 'students').sum() == expected_student_conflicts(raw_schedule_df, solver_pairs)
+
+
+def test_edits_keep_the_parents_group_pairs(store, raw_schedule_df, data_manager):
+    parent_id = store.save(raw_schedule_df, group_pairs_df=data_manager.group_intersections.to_frame())
+    child_id = store.save(raw_schedule_df, parent_id=parent_id, source=VERSION_EDIT)
+    parent_conflicts = store.conflicts(parent_id)
+    assert (parent_conflicts['conflict'] == 'students').any()
+    assert store.conflicts(child_id).values.tolist() == parent_conflicts.values.tolist()
+
+
+def test_occupants(store, raw_schedule_df):
+    version_id = store.save(raw_schedule_df)
+    row = raw_schedule_df.iloc[0]
+    occupants = store.occupants(version_id, int(row['time_slot_id']), room_id=int(row['room_id']))
+    assert row['lesson_id'] in occupants['lesson_id'].tolist()
+    assert (occupants['room_id'] == row['room_id']).all()
+
+
+def test_edit_history_and_diff(store, raw_schedule_df):
+    parent_id = store.save(raw_schedule_df)
+    edited_df = raw_schedule_df.copy()
+    moved_lesson_id = int(edited_df['lesson_id'].iloc[3])
+    edited_df.loc[edited_df['lesson_id'] == moved_lesson_id, 'time_slot_id'] = 29
+    removed_lesson_id = int(edited_df['lesson_id'].iloc[-1])
+    edited_df = edited_df[edited_df['lesson_id'] != removed_lesson_id]
+    child_id = store.save(edited_df, parent_id=parent_id, source=VERSION_EDIT)
+
+    assert store.history(child_id)['id'].tolist() == [child_id, parent_id]
+    diff = store.diff(parent_id, child_id)
+    assert sorted(diff['lesson_id'].tolist()) == sorted([moved_lesson_id, removed_lesson_id])
+    assert diff.loc[diff['lesson_id'] == moved_lesson_id, 'new_time_slot_id'].item() == 29
+    assert diff.loc[diff['lesson_id'] == removed_lesson_id, 'new_time_slot_id'].isna().all()
+    assert store.diff(parent_id, parent_id).empty
+
+
+def test_conflict_queries_use_the_indexes(tmp_path, raw_schedule_df, data_manager):
+    # No full scan of the lessons in any part of the conflict queries, with or without a lesson
+    class RecordingStore(ScheduleStore):
+        def _query(self, sql, params=()):
+            self.queries.append((sql, params))
+            return super()._query(sql, params)
+
+    store = RecordingStore(str(tmp_path / 'schedules.sqlite'))
+    store.queries = []
+    version_id = store.save(raw_schedule_df, group_pairs_df=data_manager.group_intersections.to_frame())
+    store.conflicts(version_id)
+    store.conflicts(version_id, lesson_id=int(raw_schedule_df['lesson_id'].iloc[0]))
+    with closing(sqlite3.connect(store.path)) as connection:
+        plans = [[row[-1] for row in connection.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+                 for sql, params in store.queries]
+    for plan in plans:
+        assert not [step for step in plan if step.startswith('SCAN')]
+        assert any('lessons_teacher_slot' in step for step in plan)
+    # The lesson is looked up by primary key once as each side of the pair, in all four kinds of conflict
+    assert sum('USING INDEX sqlite_autoindex_lessons_1 (version_id=? AND lesson_id=?)' in step for step in plans[1]) == 8
@@ -0,0 +1,57 @@
+import warnings
+import pandas as pd
+
+from utils.cache import INPUT_FILES
+from utils.synthetic import generate_instance, save_instance, save_instance_workbook, scaled_instance_size, BASE_INSTANCE_SIZE
+from utils.files import read_workbook_frames
+
+
+def test_scaled_instance_size():
+    assert scaled_instance_size(1) == BASE_INSTANCE_SIZE
+    assert scaled_instance_size(2)['students'] == 2 * BASE_INSTANCE_SIZE['students']
+    assert min(scaled_instance_size(0.001).values()) == 1
+
+
+def test_generate_instance_is_seeded():
+    first = generate_instance(**scaled_instance_size(0.5), seed=3)
+    second = generate_instance(**scaled_instance_size(0.5), seed=3)
+    for name in first:
+        pd.testing.assert_frame_equal(first[name], second[name])
+
+
+def test_generated_lessons_reference_known_groups_and_teachers():
+    frames = generate_instance(**scaled_instance_size(1))
+    assert set(frames['lessons']['group']) <= set(frames['groups']['name'])
+    assert set(frames['lessons']['teacher']) <= set(frames['teachers']['name'])
+    # The largest room fits the largest group
+    assert frames['audiences']['capacity'].max() >= frames['groups']['pupils'].max()
+
+
+def test_independent_programs_share_no_teachers():
+    frames = generate_instance(**scaled_instance_size(2), independent_programs=True)
+    lessons_df = frames['lessons']
+    program_of_subject = lessons_df['id'] % (scaled_instance_size(2)['students'] // 100)
+    teachers_per_program = lessons_df.groupby(program_of_subject)['teacher'].agg(set)
+    for program, teachers in teachers_per_program.items():
+        others = set().union(*(t for p, t in teachers_per_program.items() if p != program))
+        assert not teachers & others
+
+
+def test_saved_instance_reads_back_without_dtype_warnings(tmp_path):
+    from utils.data import DataManager
+
+    save_instance(generate_instance(**scaled_instance_size(10)), tmp_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(INPUT_FILES)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', pd.errors.DtypeWarning)
+        data_manager = DataManager(str(tmp_path), use_cache=False)
+    assert data_manager.input_lessons_df.shape[0] > 0
+
+
+def test_saved_workbook_has_a_sheet_per_frame(tmp_path):
+    frames = generate_instance(**scaled_instance_size(0.5))
+    path = tmp_path / 'instance.xlsx'
+    save_instance_workbook(frames, path)
+    read_back = read_workbook_frames(path.read_bytes())
+    assert list(read_back) == list(frames)
+    assert read_back['lessons'].shape == frames['lessons'].shape
@@ -0,0 +1,59 @@
+import pytest
+
+from utils.termination import (
+    get_termination_policy, score_levels, is_feasible, score_meets_limit, TerminationPolicy,
+    FEASIBLE_SCORE_LIMIT, UNCHANGED_SCORE_LIMIT, TERMINATION_BEST_SCORE, TERMINATION_SPENT, TERMINATION_UNIMPROVED,
+    TERMINATION_UNKNOWN,
+)
+
+
+def test_score_levels():
+    assert score_levels('-2hard/-1medium/-10soft') == {'hard': -2, 'medium': -1, 'soft': -10}
+    assert score_levels('0hard/0medium/0soft') == {'hard': 0, 'medium': 0, 'soft': 0}
+
+
+def test_only_hard_conflicts_make_a_score_infeasible():
+    assert is_feasible('0hard/-3medium/-20soft')
+    assert not is_feasible('-1hard/0medium/0soft')
+
+
+def test_score_meets_limit():
+    assert score_meets_limit('0hard/0medium/-30soft', FEASIBLE_SCORE_LIMIT)
+    assert not score_meets_limit('0hard/-1medium/0soft', FEASIBLE_SCORE_LIMIT)
+    assert not score_meets_limit('0hard/0medium/-1soft', UNCHANGED_SCORE_LIMIT)
+    assert score_meets_limit('0hard/0medium/0soft', UNCHANGED_SCORE_LIMIT)
+    # Different score types never match
+    assert not score_meets_limit('0hard/0soft', FEASIBLE_SCORE_LIMIT)
+
+
+def test_policies_scale_with_lesson_count_and_seconds_override_the_cap():
+    small = get_termination_policy('adaptive', 10)
+    large = get_termination_policy('adaptive', 2000)
+    assert small.spent_limit_seconds < large.spent_limit_seconds
+    assert small.unimproved_seconds < large.unimproved_seconds
+    assert get_termination_policy('adaptive', 2000, seconds=7).spent_limit_seconds == 7
+    assert get_termination_policy('fixed', 2000, seconds=7) == TerminationPolicy('fixed', spent_limit_seconds=7)
+    assert get_termination_policy('minimal_changes', 100).best_score_limit == UNCHANGED_SCORE_LIMIT
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        get_termination_policy('forever', 10)
+
+
+def test_termination_reason():
+    policy = TerminationPolicy('adaptive', best_score_limit=FEASIBLE_SCORE_LIMIT, unimproved_seconds=5, spent_limit_seconds=60)
+    assert policy.termination_reason('0hard/0medium/-4soft', 3000, 1000) == TERMINATION_BEST_SCORE
+    assert policy.termination_reason('-1hard/0medium/0soft', 60000, 58000) == TERMINATION_SPENT
+    assert policy.termination_reason('-1hard/0medium/0soft', 20000, 10000) == TERMINATION_UNIMPROVED
+    assert policy.termination_reason('-1hard/0medium/0soft', 2000, 1000) == TERMINATION_UNKNOWN
+
+
+def test_termination_reason_without_solver_timings():
+    policy = TerminationPolicy('adaptive', best_score_limit=FEASIBLE_SCORE_LIMIT, unimproved_seconds=5, spent_limit_seconds=60)
+    assert policy.termination_reason('0hard/0medium/-4soft') == TERMINATION_BEST_SCORE
+    assert policy.termination_reason('-1hard/0medium/0soft') == TERMINATION_UNKNOWN
+    assert policy.termination_reason('-1hard/0medium/0soft', 60000) == TERMINATION_SPENT
+    # Before the cap the unimproved limit is the only one left
+    assert policy.termination_reason('-1hard/0medium/0soft', 20000) == TERMINATION_UNIMPROVED
+    assert TerminationPolicy('fixed', spent_limit_seconds=60).termination_reason('-1hard/0medium/0soft', 2000) == TERMINATION_UNKNOWN
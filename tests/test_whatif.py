@@ -0,0 +1,73 @@
+import pytest
+
+from utils.schedule import selected_lesson_id
+from utils.whatif import AlternativeSlotFinder
+
+
+@pytest.fixture
+def finder(data_manager, raw_schedule_df):
+    return AlternativeSlotFinder(data_manager, raw_schedule_df)
+
+
+def lesson_row(raw_schedule_df, lesson_id):
+    return raw_schedule_df[raw_schedule_df['lesson_id'] == lesson_id].iloc[0]
+
+
+def test_selected_lesson_id_is_not_the_schedule_id(raw_schedule_df):
+    row = raw_schedule_df[raw_schedule_df['schedule_id'] != raw_schedule_df['lesson_id']].iloc[0]
+    assert selected_lesson_id(raw_schedule_df, row['text']) == row['lesson_id']
+    assert selected_lesson_id(raw_schedule_df, row['text']) != row['schedule_id']
+
+
+def test_conflict_matrix_leaves_the_lesson_itself_out(finder, raw_schedule_df):
+    row = raw_schedule_df.iloc[0]
+    conflicts = finder.conflict_matrix(row['lesson_id'])
+    room_num = finder.room_index[row['room_id']]
+    others_in_room = ((raw_schedule_df['time_slot_id'] == row['time_slot_id'])
+                      & (raw_schedule_df['room_id'] == row['room_id'])).sum() - 1
+    assert conflicts['room_conflicts'][row['time_slot_id'], room_num] == others_in_room
+    # Occupancy is restored afterwards
+    assert finder.room_occupancy[room_num, row['time_slot_id']] == others_in_room + 1
+
+
+def test_teacher_conflicts_match_the_schedule(finder, raw_schedule_df):
+    row = raw_schedule_df.iloc[5]
+    conflicts = finder.conflict_matrix(row['lesson_id'])
+    others = raw_schedule_df[(raw_schedule_df['teacher'] == row['teacher'])
+                             & (raw_schedule_df['lesson_id'] != row['lesson_id'])]
+    expected = others['time_slot_id'].value_counts()
+    for timeslot_id in range(len(finder.timeslot_list)):
+        assert conflicts['teacher_conflicts'][timeslot_id, 0] == expected.get(timeslot_id, 0)
+
+
+def test_find_alternatives_skips_forbidden_timeslots_and_keeps_the_fewest_conflicts(finder, raw_schedule_df):
+    row = raw_schedule_df.iloc[10]
+    forbidden = {int(row['time_slot_id']): 1}
+    options_df = finder.find_alternatives(row['lesson_id'], forbidden_timeslot_ids=forbidden, limit=5)
+    assert 0 < len(options_df) <= 5
+    assert not options_df['time_slot_id'].isin(forbidden).any()
+    assert options_df['conflicts'].nunique() == 1
+
+    unlimited_df = finder.find_alternatives(row['lesson_id'], forbidden_timeslot_ids=forbidden)
+    assert unlimited_df['conflicts'].min() == options_df['conflicts'].iloc[0]
+
+
+def test_apply_move_only_changes_the_moved_lesson(finder, raw_schedule_df):
+    row = raw_schedule_df.iloc[20]
+    option = finder.find_alternatives(row['lesson_id'], forbidden_timeslot_ids={int(row['time_slot_id']): 1}, limit=1).iloc[0]
+    moved_df = finder.apply_move(raw_schedule_df, row['lesson_id'], option['time_slot_id'], option['room_id'])
+
+    moved = lesson_row(moved_df, row['lesson_id'])
+    assert moved['time_slot_id'] == option['time_slot_id']
+    assert moved['room_id'] == option['room_id']
+    assert moved['day'] == option['day']
+    unchanged = moved_df['lesson_id'] != row['lesson_id']
+    assert moved_df[unchanged].equals(raw_schedule_df[unchanged])
+
+
+def test_describe_conflicts_names_the_shared_teacher(finder, raw_schedule_df):
+    taught = raw_schedule_df.groupby('teacher')['lesson_id'].agg(list)
+    lesson_id, other_id = next(ids for ids in taught if len(ids) > 1)[:2]
+    other = lesson_row(raw_schedule_df, other_id)
+    clashes = finder.describe_conflicts(lesson_id, int(other['time_slot_id']), -1)
+    assert any(clash['lesson_id'] == other_id and 'teacher' in clash['reason'] for clash in clashes)
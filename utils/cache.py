@@ -0,0 +1,67 @@
+import os
+import pickle
+import hashlib
+import pandas as pd
+from loguru import logger
+
+CACHE_DIR = '.cache/data_manager'
+# Bump when preprocessing output changes, so old entries stop matching
+CACHE_VERSION = 6
+MAX_CACHE_ENTRIES = 8
+INPUT_FILES = ['audiences.csv', 'groups.csv', 'students.csv', 'lessons.csv', 'teachers.csv']
+
+
+def hash_input_files(data_path, file_names=INPUT_FILES):
+    h = hashlib.sha256(f'{CACHE_VERSION}:{pd.__version__}'.encode())
+    for name in file_names:
+        h.update(name.encode())
+        with open(os.path.join(data_path, name), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_workbook(content_hash):
+    return hashlib.sha256(f'{CACHE_VERSION}:{pd.__version__}:workbook:{content_hash}'.encode()).hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f'{key}.pkl')
+
+
+def load_cached_state(key, cache_dir=CACHE_DIR):
+    path = _cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        logger.warning(f'Dropping unreadable cache entry {path}: {e}')
+        os.remove(path)
+        return None
+    # Touch the entry so pruning keeps recently used datasets
+    os.utime(path)
+    logger.debug(f'Loaded preprocessed data from cache {path}')
+    return state
+
+
+def save_cached_state(key, state, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(key, cache_dir)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    logger.debug(f'Saved preprocessed data to cache {path}')
+    _prune_cache(cache_dir)
+
+
+def _prune_cache(cache_dir, max_entries=MAX_CACHE_ENTRIES):
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.pkl')]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[max_entries:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
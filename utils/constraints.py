@@ -2,31 +2,58 @@ from .entities import *
 import optapy
 from optapy import constraint_provider, get_class
 from optapy.constraint import Joiners
-from optapy.score import HardSoftScore
-from optapy.types import Duration
+from optapy.score import HardMediumSoftScore
 from loguru import logger
+from .termination import SOLVING_DURATION, fixed_policy
 LessonClass = get_class(Lesson)
 RoomClass = get_class(Room)
+StudentGroupConflictClass = get_class(StudentGroupConflict)
+ForbiddenTimeslotClass = get_class(ForbiddenTimeslot)
 
-SOLVING_DURATION = 10
+# Set only while a profiling constraint provider is building its streams
+_callback_profiler = None
+
+def callback(name, function):
+    # Lambdas passed to Java go through here, so a profiler can count and time them
+    if _callback_profiler is None:
+        return function
+    return _callback_profiler.wrap(name, function)
 
 @constraint_provider
 def define_constraints(constraint_factory):
+    return [constraint(constraint_factory) for constraint in get_constraints()]
+
+def get_constraints():
     return [
         # Hard constraints
-        room_conflict(constraint_factory),
-        teacher_conflict(constraint_factory),
-        student_group_conflict(constraint_factory),
-        room_capacity_conflict(constraint_factory),
-        teacher_availability_conflict(constraint_factory),
-        student_conflict(constraint_factory),
-        penalize_lesson_not_in_ideal_timeslot(constraint_factory),
-        penalize_lesson_not_in_ideal_room(constraint_factory),
-        penalize_lesson_in_forbidden_timeslot(constraint_factory)
-        #multiple_groups_same_subject_together()
+        room_conflict,
+        teacher_conflict,
+        student_group_conflict,
+        room_capacity_conflict,
+        teacher_availability_conflict,
+        student_conflict,
+        penalize_lesson_not_in_ideal_timeslot,
+        penalize_lesson_not_in_ideal_room,
+        penalize_lesson_in_forbidden_timeslot
+        #multiple_groups_same_subject_together
         # Soft constraints are only implemented in the optapy-quickstarts code
     ]
 
+def build_constraint_provider(enabled_constraints=None, profiler=None):
+    # A separate provider with a subset of the constraints and/or profiled callbacks
+    constraints = [constraint for constraint in get_constraints()
+                   if enabled_constraints is None or constraint.__name__ in enabled_constraints]
+
+    def selected_constraints(constraint_factory):
+        global _callback_profiler
+        _callback_profiler = profiler
+        try:
+            return [constraint(constraint_factory) for constraint in constraints]
+        finally:
+            _callback_profiler = None
+
+    return constraint_provider(selected_constraints)
+
 def room_conflict(constraint_factory):
     # A room can accommodate at most one lesson at the same time.
     return constraint_factory \
@@ -34,13 +61,13 @@ def room_conflict(constraint_factory):
             .join(LessonClass,
                 [
                     # ... in the same timeslot ...
-                    Joiners.equal(lambda lesson: lesson.timeslot),
+                    Joiners.equal(callback('room_conflict.timeslot', lambda lesson: lesson.timeslot)),
                     # ... in the same room ...
-                    Joiners.equal(lambda lesson: lesson.room),
+                    Joiners.equal(callback('room_conflict.room', lambda lesson: lesson.room)),
                     # ... and the pair is unique (different id, no reverse pairs) ...
-                    Joiners.lessThan(lambda lesson: lesson.id)
+                    Joiners.lessThan(callback('room_conflict.id', lambda lesson: lesson.id))
                 ]) \
-            .penalize("Room conflict", HardSoftScore.ONE_HARD)
+            .penalize("Room conflict", HardMediumSoftScore.ONE_HARD)
 
 def teacher_conflict(constraint_factory):
     # A teacher can teach at most one lesson at the same time.
@@ -48,11 +75,11 @@ def teacher_conflict(constraint_factory):
                 .forEach(LessonClass)\
                 .join(LessonClass,
                         [
-                            Joiners.equal(lambda lesson: lesson.timeslot),
-                            Joiners.equal(lambda lesson: lesson.teacher.name),
-                    Joiners.lessThan(lambda lesson: lesson.id)
+                            Joiners.equal(callback('teacher_conflict.timeslot', lambda lesson: lesson.timeslot)),
+                            Joiners.equal(callback('teacher_conflict.teacher', lambda lesson: lesson.teacher.id)),
+                    Joiners.lessThan(callback('teacher_conflict.id', lambda lesson: lesson.id))
                         ]) \
-                .penalize("Teacher conflict", HardSoftScore.ONE_HARD)
+                .penalize("Teacher conflict", HardMediumSoftScore.ONE_HARD)
 
 def student_group_conflict(constraint_factory):
     # A student can attend at most one lesson at the same time.
@@ -60,11 +87,11 @@ def student_group_conflict(constraint_factory):
             .forEach(LessonClass) \
             .join(LessonClass,
                 [
-                    Joiners.equal(lambda lesson: lesson.timeslot),
-                    Joiners.equal(lambda lesson: lesson.student_group),
-                    Joiners.lessThan(lambda lesson: lesson.id)
+                    Joiners.equal(callback('student_group_conflict.timeslot', lambda lesson: lesson.timeslot)),
+                    Joiners.equal(callback('student_group_conflict.student_group', lambda lesson: lesson.student_group)),
+                    Joiners.lessThan(callback('student_group_conflict.id', lambda lesson: lesson.id))
                 ]) \
-            .penalize("Student group conflict", HardSoftScore.ONE_HARD)
+            .penalize("Student group conflict", HardMediumSoftScore.ONE_HARD)
 
 def multiple_groups_same_subject_together(constraint_factory):
     # If two student groups are listening to the same subject at the same time,
@@ -74,85 +101,94 @@ def multiple_groups_same_subject_together(constraint_factory):
             .join(LessonClass,
                 [
                     # ... in the same timeslot ...
-                    Joiners.equal(lambda lesson: lesson.timeslot),
+                    Joiners.equal(callback('multiple_groups_same_subject_together.timeslot', lambda lesson: lesson.timeslot)),
                     # ... for the same subject ...
-                    Joiners.equal(lambda lesson: lesson.subject),
+                    Joiners.equal(callback('multiple_groups_same_subject_together.subject', lambda lesson: lesson.subject)),
                     # ... and the pair is unique (different id, no reverse pairs) ...
-                    Joiners.lessThan(lambda lesson: lesson.id),
+                    Joiners.lessThan(callback('multiple_groups_same_subject_together.id', lambda lesson: lesson.id)),
                     # ... but different student groups ...
-                    Joiners.filtering(lambda lessonA, lessonB: lessonA.student_group != lessonB.student_group),
+                    Joiners.filtering(callback('multiple_groups_same_subject_together.different_groups', lambda lessonA, lessonB: lessonA.student_group != lessonB.student_group)),
                     # ... and different rooms ...
-                    Joiners.filtering(lambda lessonA, lessonB: lessonA.room != lessonB.room)
+                    Joiners.filtering(callback('multiple_groups_same_subject_together.different_rooms', lambda lessonA, lessonB: lessonA.room != lessonB.room))
                 ]) \
-            .penalize("Multiple student groups for the same subject must be together", HardSoftScore.ONE_HARD)
+            .penalize("Multiple student groups for the same subject must be together", HardMediumSoftScore.ONE_HARD)
 
 def room_capacity_conflict(constraint_factory):
     # A room must have a capacity greater than or equal to the student group size.
     return constraint_factory \
         .forEach(LessonClass) \
-        .filter(lambda lesson: lesson.room is not None and
-                lesson.room.capacity < lesson.student_group_capacity) \
-        .penalize("Room capacity conflict", HardSoftScore.ONE_HARD)
+        .filter(callback('room_capacity_conflict.capacity', lambda lesson: lesson.room is not None and
+                lesson.room.capacity < lesson.student_group_capacity)) \
+        .penalize("Room capacity conflict", HardMediumSoftScore.ONE_HARD)
 
 def teacher_availability_conflict(constraint_factory):
     # A lesson can only be scheduled in a time slot if the teacher is available.
     return constraint_factory \
         .forEach(LessonClass) \
-        .filter(lambda lesson: not lesson.teacher.is_available(lesson.timeslot)) \
-        .penalize("Teacher availability conflict", HardSoftScore.ONE_HARD)
+        .filter(callback('teacher_availability_conflict.is_available', lambda lesson: not lesson.teacher.is_available(lesson.timeslot))) \
+        .penalize("Teacher availability conflict", HardMediumSoftScore.ONE_HARD)
 
 def student_conflict(constraint_factory):
     # Students in intersecting groups cannot attend lessons at the same time.
+    # Every intersecting pair of groups is a StudentGroupConflict fact, so lesson pairs
+    # are found with equality joins only (no per-pair filtering).
     return constraint_factory \
-        .forEach(LessonClass) \
+        .forEach(StudentGroupConflictClass) \
+        .join(LessonClass,
+              [
+                  Joiners.equal(callback('student_conflict.conflict_group', lambda conflict: conflict.group_id),
+                                callback('student_conflict.lesson_group', lambda lesson: lesson.student_group.id))
+              ]) \
         .join(LessonClass,
               [
-                  Joiners.equal(lambda lesson: lesson.timeslot),
-                  Joiners.lessThan(lambda lesson: lesson.id),
-                  # Check if the student groups of the two lessons intersect
-                  Joiners.filtering(lambda lessonA, lessonB:
-                                    lessonA.group_intersection.get(lessonA.student_group.name, {}).get(lessonB.student_group.name, 0) == 1 or
-                                    lessonA.group_intersection.get(lessonB.student_group.name, {}).get(lessonA.student_group.name, 0) == 1)
+                  Joiners.equal(callback('student_conflict.conflict_other_group', lambda conflict, lesson: conflict.other_group_id),
+                                callback('student_conflict.other_lesson_group', lambda lesson: lesson.student_group.id)),
+                  Joiners.equal(callback('student_conflict.lesson_timeslot', lambda conflict, lesson: lesson.timeslot),
+                                callback('student_conflict.other_lesson_timeslot', lambda lesson: lesson.timeslot))
               ]) \
-        .penalize("Student conflict", HardSoftScore.ONE_HARD)
+        .penalize("Student conflict", HardMediumSoftScore.ONE_HARD)
 
 def penalize_lesson_not_in_ideal_timeslot(constraint_factory):
     # Apply a penalty if a lesson's timeslot is not the same as its ideal timeslot.
     return constraint_factory \
         .forEach(Lesson) \
-        .filter(lambda lesson: lesson.is_fixed and lesson.timeslot.id != lesson.ideal_timeslot_id) \
-        .penalize("Lesson not in ideal timeslot", HardSoftScore.ofHard(10))  # Increased penalty
+        .filter(callback('penalize_lesson_not_in_ideal_timeslot.ideal_timeslot', lambda lesson: lesson.is_fixed and lesson.timeslot.id != lesson.ideal_timeslot_id)) \
+        .penalize("Lesson not in ideal timeslot", HardMediumSoftScore.ofSoft(10))  # Moving in time disrupts more than changing rooms
 
 def penalize_lesson_not_in_ideal_room(constraint_factory):
     # Apply a penalty if a lesson's room is not the same as its ideal room.
     return constraint_factory \
         .forEach(Lesson) \
-        .filter(lambda lesson: lesson.is_fixed and lesson.room.id != lesson.ideal_room_id) \
-        .penalize("Lesson not in ideal room", HardSoftScore.ONE_HARD)  # Increased penalty
+        .filter(callback('penalize_lesson_not_in_ideal_room.ideal_room', lambda lesson: lesson.is_fixed and lesson.room.id != lesson.ideal_room_id)) \
+        .penalize("Lesson not in ideal room", HardMediumSoftScore.ONE_SOFT)
 
 def penalize_lesson_in_forbidden_timeslot(constraint_factory):
-    print("NEW VERSION V23")
-    def log_and_return(lesson):
-        # if lesson.id == 2:
-        #     logger.debug(f"lesson.timeslot.id {lesson.timeslot.id}; lesson.forbidden_timeslots: {lesson.forbidden_timeslots}")
-        # if lesson.forbidden_timeslots.get(lesson.timeslot.id, 0) == 1:
-        #     logger.debug(f"Penalizing: {lesson.id} in timeslot {lesson.timeslot.id}")
-        return lesson.forbidden_timeslots.get(lesson.timeslot.id, 0) == 1
-
+    # A lesson being rescheduled must not go back to any of its forbidden timeslots.
     return constraint_factory \
-        .forEach(Lesson) \
-        .filter(log_and_return) \
-        .penalize("Lesson in forbidden timeslot", HardSoftScore.ofHard(20))
+        .forEach(LessonClass) \
+        .join(ForbiddenTimeslotClass,
+              [
+                  Joiners.equal(callback('penalize_lesson_in_forbidden_timeslot.lesson_id', lambda lesson: lesson.id),
+                                callback('penalize_lesson_in_forbidden_timeslot.forbidden_lesson_id', lambda forbidden: forbidden.lesson_id)),
+                  Joiners.equal(callback('penalize_lesson_in_forbidden_timeslot.lesson_timeslot', lambda lesson: lesson.timeslot.id),
+                                callback('penalize_lesson_in_forbidden_timeslot.forbidden_timeslot', lambda forbidden: forbidden.timeslot_id))
+              ]) \
+        .penalize("Lesson in forbidden timeslot", HardMediumSoftScore.ONE_MEDIUM)
 
-def get_solver_config():
+def get_solver_config(constraint_provider_function=define_constraints, solving_duration=SOLVING_DURATION, termination=None):
+    # termination is a TerminationPolicy; without one the solve runs for solving_duration seconds
+    termination = termination if termination is not None else fixed_policy(seconds=solving_duration)
     solver_config = optapy.config.solver.SolverConfig().withEntityClasses(get_class(Lesson)) \
     .withSolutionClass(get_class(TimeTable)) \
-    .withConstraintProviderClass(get_class(define_constraints)) \
-    .withTerminationSpentLimit(Duration.ofSeconds(SOLVING_DURATION)) \
+    .withConstraintProviderClass(get_class(constraint_provider_function)) \
+    .withTerminationConfig(termination.to_termination_config()) \
     .withPhases([
-        optapy.config.constructionheuristic.ConstructionHeuristicPhaseConfig(),
+        # Lessons come hardest first and rooms smallest first (DataManager sorts them),
+        # so first fit in list order is first fit decreasing
+        optapy.config.constructionheuristic.ConstructionHeuristicPhaseConfig()
+            .withConstructionHeuristicType(optapy.config.constructionheuristic.ConstructionHeuristicType.FIRST_FIT),
         optapy.config.localsearch.LocalSearchPhaseConfig()
             .withAcceptorConfig(optapy.config.localsearch.decider.acceptor.LocalSearchAcceptorConfig()
-                                .withSimulatedAnnealingStartingTemperature("0hard/0soft"))
+                                .withSimulatedAnnealingStartingTemperature("0hard/0medium/0soft"))
     ])    
     return solver_config
\ No newline at end of file
@@ -1,37 +1,79 @@
 import re
 import pandas as pd
 import numpy as np
-from .preprocessing import strip_whitespace, get_group_intersections
-from .time_utils import get_teacher_availability, get_timeslot_list
+from collections import Counter
+from .preprocessing import strip_whitespace, to_group_name, get_group_intersections, get_group_columns, get_enrollment_counts
+from .cache import hash_input_files, hash_workbook, load_cached_state, save_cached_state
+from .time_utils import get_teacher_availability, get_timeslot_list, get_availability_mask
 from loguru import logger
-from .entities import Lesson, Room, Timeslot, TimeTable, StudentGroup, Teacher
+from .entities import Lesson, Room, Timeslot, TimeTable, StudentGroup, StudentGroupConflict, ForbiddenTimeslot, Teacher
 
 
 class DataManager:
-    def __init__(self, data_path, existing_schedule_df=None):
-        self.input_audiences_df = pd.read_csv(f'{data_path}/audiences.csv').map(strip_whitespace)
-        self.input_groups_df = pd.read_csv(f'{data_path}/groups.csv').map(strip_whitespace)
-        self.input_students_df = pd.read_csv(f'{data_path}/students.csv').map(strip_whitespace)
-        self.input_lessons_df = pd.read_csv(f'{data_path}/lessons.csv').map(strip_whitespace)
-        self.input_teachers_df = pd.read_csv(f'{data_path}/teachers.csv')    
-    
+    # Everything preprocessing() produces; persisted together under a hash of the input files
+    CACHED_ATTRIBUTES = [
+        'input_audiences_df', 'input_groups_df', 'input_students_df', 'input_lessons_df', 'input_teachers_df',
+        'group_to_pupils', 'group_to_id', 'group_intersections', 'enrollment_counts',
+        'teachers_availability', 'teacher_to_id', 'teachers_availability_mask',
+    ]
+
+    def __init__(self, data_path=None, existing_schedule_df=None, use_cache=True, workbook=None):
         self.group_to_pupils = {}
         self.group_to_id = {}
-        self.group_intersection = {}
+        self.group_intersections = None
+        self.enrollment_counts = None
         self.teachers_availability = None
+        self.teacher_to_id = {}
+        self.teachers_availability_mask = {}
         self.existing_schedule_df = existing_schedule_df
         self.existing_schedule_records = {}
 
-        self.preprocessing()
+        cache_key = None
+        if use_cache:
+            cache_key = hash_workbook(workbook.content_hash) if workbook is not None else hash_input_files(data_path)
+        cached_state = load_cached_state(cache_key) if use_cache else None
+
+        if cached_state is not None:
+            for attribute in self.CACHED_ATTRIBUTES:
+                setattr(self, attribute, cached_state[attribute])
+        else:
+            if workbook is not None:
+                self.read_input_frames(workbook.frames)
+            else:
+                self.read_input_files(data_path)
+            self.preprocessing()
+            if use_cache:
+                save_cached_state(cache_key, {attribute: getattr(self, attribute) for attribute in self.CACHED_ATTRIBUTES})
 
         if type(self.existing_schedule_df) == pd.DataFrame:
             self.processexisting_schedule()
 
+    def read_input_files(self, data_path):
+        # Group columns are mostly empty, left to pandas their type would be guessed per chunk
+        group_columns = get_group_columns(pd.read_csv(f'{data_path}/students.csv', nrows=0))
+        self.read_input_frames({
+            name: pd.read_csv(f'{data_path}/{name}.csv', dtype={column: str for column in group_columns} if name == 'students' else None)
+            for name in ['audiences', 'groups', 'students', 'lessons', 'teachers']
+        })
+
+    def read_input_frames(self, frames):
+        self.input_audiences_df = frames['audiences'].map(strip_whitespace)
+        self.input_groups_df = frames['groups'].map(strip_whitespace)
+        self.input_students_df = frames['students'].map(strip_whitespace)
+        self.input_lessons_df = frames['lessons'].map(strip_whitespace)
+        self.input_teachers_df = frames['teachers'].copy()
+
+        # Group names are keys shared by the three sheets, text whichever way they were read
+        group_columns = get_group_columns(self.input_students_df)
+        self.input_students_df[group_columns] = self.input_students_df[group_columns].astype(object).map(to_group_name)
+        self.input_groups_df['name'] = self.input_groups_df['name'].astype(object).map(to_group_name)
+        self.input_lessons_df['group'] = self.input_lessons_df['group'].astype(object).map(to_group_name)
+
     def processexisting_schedule(self):
         for _, row in self.existing_schedule_df.iterrows():
             self.existing_schedule_records[row['lesson_id']] = {
-                'time_slot_id': row['time_slot_id'],
-                'room_id': row['room_id']
+                'time_slot_id': int(row['time_slot_id']),
+                'room_id': int(row['room_id'])
             }
             
 
@@ -63,14 +105,15 @@ class DataManager:
         self.input_students_df['name'] = self.input_students_df['Прізвище'] + ' ' +  self.input_students_df["Ім'я"]
 
     def _preprocess_groups(self):
-        self.group_intersection = get_group_intersections(self.input_students_df)
+        self.group_intersections = get_group_intersections(self.input_students_df)
 
         for subject in self.input_students_df.columns[3:]:
             d = self.input_students_df[subject].value_counts().to_dict()
             d = {k.rstrip().lstrip(): v for k, v in d.items()}
             self.group_to_pupils.update(d)
 
-        self.group_to_id = {k: num for num, (k,v) in enumerate(self.group_to_pupils.items())}
+        # Group ids are the columns of the incidence matrix, so they can index the intersection graph directly
+        self.group_to_id = {k: self.group_intersections.group_index[k] for k in self.group_to_pupils}
 
     def _preprocess_lessons(self):
         # TODO: add support of online lections
@@ -85,8 +128,15 @@ class DataManager:
         self.input_lessons_df['pupils'] = self.input_lessons_df['group'].apply(lambda v: self.group_to_pupils.get(v, -1))
         logger.debug(f'Before filtering lessons count: {self.input_lessons_df.shape[0]}')
         logger.warning(f"This groups doesnt have pupils: {self.input_lessons_df[self.input_lessons_df['pupils'] == -1]['group'].values.tolist()}")
-        self.input_lessons_df = self.input_lessons_df[self.input_lessons_df['pupils'] != - 1]
+        self.input_lessons_df = self.input_lessons_df[self.input_lessons_df['pupils'] != - 1].copy()
         logger.debug(f'After filtering lessons count: {self.input_lessons_df.shape[0]}')
+
+        # Students of this exact (subject column, group); NaN when the subject has no column in students
+        self.enrollment_counts = get_enrollment_counts(self.input_students_df)
+        subjects = self.input_lessons_df['subject'].str.strip()
+        capacity = self.enrollment_counts.reindex(pd.MultiIndex.from_arrays([subjects, self.input_lessons_df['group']]))
+        known_subject = subjects.isin(get_group_columns(self.input_students_df)).to_numpy()
+        self.input_lessons_df['student_group_capacity'] = np.where(known_subject, capacity.fillna(0).to_numpy(), np.nan)
         
 
     def _preprocess_teachers(self):
@@ -98,61 +148,159 @@ class DataManager:
         self.input_teachers_df['name'] = self.input_teachers_df['name'].apply(lambda v: v.rstrip().lstrip())
         self.input_teachers_df = self.input_teachers_df.replace('online ', 1).fillna(1)
         self.teachers_availability = get_teacher_availability(self.input_teachers_df, timeslot_dict)
+        self.teacher_to_id = {name: num for num, name in enumerate(self.teachers_availability)}
+        self.teachers_availability_mask = {name: get_availability_mask(v) for name, v in self.teachers_availability.items()}
 
 
-    def generate_optapy_problem(self, reschedule_lesson_id=None, forbidden_time_slots=None):
+    def generate_optapy_problem(self, reschedule_lesson_id=None, forbidden_time_slots=None, pin_existing=True):
+        # Lessons from the existing schedule start in their scheduled timeslot and room,
+        # and with pin_existing the solver only moves the lessons that are not in it
         timeslot_list = get_timeslot_list()
+        timeslot_by_id = {timeslot.id: timeslot for timeslot in timeslot_list}
 
         room_list = []
         for _, row in self.input_audiences_df.iterrows():
             room_list.append(Room(row['id'], row['name'], row['capacity']))
+        room_by_id = {room.id: room for room in room_list}
 
         group_objects = {}
         for group_name, pupils in self.group_to_pupils.items():
             group_id = self.group_to_id[group_name]
             group_objects[group_name] = StudentGroup(group_id, group_name, pupils)
 
+        # One shared fact per teacher, lessons only hold a reference to it
+        teacher_objects = {
+            name: Teacher(teacher_id, name, self.teachers_availability_mask[name])
+            for name, teacher_id in self.teacher_to_id.items()
+        }
+
+        lessons_df = self.input_lessons_df
+        has_enrollment = lessons_df['student_group_capacity'].notna()
+        if not has_enrollment.all():
+            logger.warning(f"No students column for subjects: {lessons_df.loc[~has_enrollment, 'subject'].unique().tolist()}")
 
         lesson_list = []
+        forbidden_timeslot_list = []
+        rows = zip(lessons_df['id'].tolist(), lessons_df['subject'].tolist(), lessons_df['teacher'].tolist(),
+                   lessons_df['group'].tolist(), lessons_df['student_group_capacity'].tolist(), has_enrollment.tolist())
 
-        for num, (_, row) in enumerate(self.input_lessons_df.iterrows()):
+        for lesson_id, subject, teacher_name, group_name, capacity, enrolled in rows:
+            if not enrolled:
+                continue
             try:
-                students_df = self.input_students_df[self.input_students_df[row['subject'].strip()] ==  row['group']].copy()
-
-                group = group_objects[row['group']] #StudentGroup(group_to_id[row['group']], row['group'], students_df.shape[0])
-                
-                if num == reschedule_lesson_id:
-                    #print('reschedule_lesson_id', reschedule_lesson_id)
-                    lesson = Lesson(row['id'], row['subject'], 
-                                    Teacher(row['teacher'], self.teachers_availability[row['teacher']]),
-                                    group, students_df.shape[0], group_intersection=self.group_intersection,
-                                    forbidden_timeslots={int(k): int(v) for k, v in forbidden_time_slots.items()}, is_fixed=False)
-
-                elif row['id'] in self.existing_schedule_records:
-                    #print('in existing_schedule_records', num)
-                    ideal_time_slot_id = self.existing_schedule_records[row['id']]['time_slot_id']
-                    ideal_room_id = self.existing_schedule_records[row['id']]['room_id']
-                    lesson = Lesson(row['id'], row['subject'],
-                            Teacher(row['teacher'], self.teachers_availability[row['teacher']]),
-                            group, students_df.shape[0], group_intersection=self.group_intersection, 
-                            ideal_room_id=ideal_room_id, ideal_timeslot_id=ideal_time_slot_id, is_fixed=True)
+                group = group_objects[group_name]
+                capacity = int(capacity)
+
+                if lesson_id == reschedule_lesson_id:
+                    lesson = Lesson(lesson_id, subject,
+                                    teacher_objects[teacher_name],
+                                    group, capacity, is_fixed=False)
+                    forbidden_timeslot_list = [
+                        ForbiddenTimeslot(num_forbidden, lesson_id, int(timeslot_id))
+                        for num_forbidden, (timeslot_id, forbidden) in enumerate(forbidden_time_slots.items())
+                        if int(forbidden) == 1
+                    ]
+
+                elif lesson_id in self.existing_schedule_records:
+                    ideal_time_slot_id = self.existing_schedule_records[lesson_id]['time_slot_id']
+                    ideal_room_id = self.existing_schedule_records[lesson_id]['room_id']
+                    timeslot = timeslot_by_id.get(ideal_time_slot_id)
+                    room = room_by_id.get(ideal_room_id)
+                    lesson = Lesson(lesson_id, subject,
+                            teacher_objects[teacher_name],
+                            group, capacity, timeslot=timeslot, room=room,
+                            ideal_room_id=ideal_room_id, ideal_timeslot_id=ideal_time_slot_id, is_fixed=True,
+                            is_pinned=pin_existing and timeslot is not None and room is not None)
 
                 else:
-                    lesson = Lesson(row['id'], row['subject'],
-                                    Teacher(row['teacher'], self.teachers_availability[row['teacher']]),
-                                    group, students_df.shape[0], group_intersection=self.group_intersection)
-                #print(lesson)
+                    lesson = Lesson(lesson_id, subject,
+                                    teacher_objects[teacher_name],
+                                    group, capacity)
                 lesson_list.append(lesson)
             except Exception as e:
-                print('exception', e)
-
-        lesson = lesson_list[0]
-        lesson.is_pinned = True
-        lesson.set_timeslot(timeslot_list[0])
-        lesson.set_room(room_list[0])
-        
-        lesson_list[0] = lesson
-        return TimeTable(timeslot_list, room_list, lesson_list)
+                logger.warning(f'Skipping lesson {lesson_id}: {e!r}')
+
+        logger.debug(f'{sum(lesson.is_pinned for lesson in lesson_list)} of {len(lesson_list)} lessons pinned')
+        self._set_value_ranges(lesson_list, timeslot_list, room_list, forbidden_timeslot_list)
+
+        used_teacher_ids = {lesson.teacher.id for lesson in lesson_list}
+        teacher_list = [teacher for teacher in teacher_objects.values() if teacher.id in used_teacher_ids]
+        # Groups that have lessons, in first-use order
+        student_group_list = list({lesson.student_group.id: lesson.student_group for lesson in lesson_list}.values())
+        group_conflict_list = self._generate_group_conflicts([group.id for group in student_group_list])
+        # The construction heuristic places lessons in list order
+        lesson_list = self._sort_by_difficulty(lesson_list)
+        return TimeTable(timeslot_list, room_list, lesson_list, teacher_list, group_conflict_list,
+                         forbidden_timeslot_list, student_group_list)
+
+    def _set_value_ranges(self, lesson_list, timeslot_list, room_list, forbidden_timeslot_list):
+        # Rooms that fit the group and timeslots the teacher is available in, so room capacity
+        # and teacher availability hold by construction. Lessons with the same group size or
+        # teacher availability share one list.
+        forbidden = {(forbidden.lesson_id, forbidden.timeslot_id) for forbidden in forbidden_timeslot_list}
+        forbidden_lesson_ids = {lesson_id for lesson_id, _ in forbidden}
+        # Smallest rooms first, so first fit leaves the big rooms for the big groups
+        room_list = sorted(room_list, key=lambda room: room.capacity)
+        room_ranges = {}
+        timeslot_ranges = {}
+        for lesson in lesson_list:
+            capacity = lesson.student_group_capacity
+            if capacity not in room_ranges:
+                room_ranges[capacity] = [room for room in room_list if room.capacity >= capacity]
+                if not room_ranges[capacity]:
+                    logger.warning(f'No room fits {capacity} students, allowing every room')
+                    room_ranges[capacity] = room_list
+
+            mask = lesson.teacher.availability_mask
+            if mask not in timeslot_ranges:
+                timeslot_ranges[mask] = [timeslot for timeslot in timeslot_list if lesson.teacher.is_available(timeslot)]
+                if not timeslot_ranges[mask]:
+                    logger.warning(f'Teacher {lesson.teacher.name} is never available, allowing every timeslot')
+                    timeslot_ranges[mask] = timeslot_list
+
+            lesson.room_range = room_ranges[capacity]
+            lesson.timeslot_range = timeslot_ranges[mask]
+            if lesson.id in forbidden_lesson_ids:
+                lesson.timeslot_range = [timeslot for timeslot in lesson.timeslot_range
+                                         if (lesson.id, timeslot.id) not in forbidden] or lesson.timeslot_range
+
+            # Pinned lessons keep whatever the existing schedule gave them
+            if lesson.timeslot is not None and lesson.timeslot not in lesson.timeslot_range:
+                lesson.timeslot_range = lesson.timeslot_range + [lesson.timeslot]
+            if lesson.room is not None and lesson.room not in lesson.room_range:
+                lesson.room_range = lesson.room_range + [lesson.room]
+
+    def _sort_by_difficulty(self, lesson_list):
+        # Most constrained first: least timeslot slack for the teacher, fewest fitting rooms,
+        # most lessons in intersecting groups, biggest group. Pinned lessons are already placed.
+        teacher_lessons = Counter(lesson.teacher.id for lesson in lesson_list)
+        group_lessons = Counter(lesson.student_group.id for lesson in lesson_list)
+        intersecting_lessons = {
+            group_id: sum(group_lessons.get(other, 0) for other in self.group_intersections.neighbours(group_id).tolist())
+            for group_id in group_lessons
+        }
+
+        def difficulty(lesson):
+            return (
+                not lesson.is_pinned,
+                len(lesson.timeslot_range) - teacher_lessons[lesson.teacher.id],
+                len(lesson.room_range),
+                -intersecting_lessons[lesson.student_group.id],
+                -lesson.student_group_capacity,
+                lesson.id,
+            )
+
+        return sorted(lesson_list, key=difficulty)
+
+    def _generate_group_conflicts(self, used_group_ids):
+        group_ids, other_group_ids, shared_students = self.group_intersections.pairs()
+        used_group_ids = np.fromiter(used_group_ids, dtype=group_ids.dtype)
+        used = np.isin(group_ids, used_group_ids) & np.isin(other_group_ids, used_group_ids)
+        return [
+            StudentGroupConflict(num, group_id, other_group_id, shared)
+            for num, (group_id, other_group_id, shared) in enumerate(zip(
+                group_ids[used].tolist(), other_group_ids[used].tolist(), shared_students[used].tolist()))
+        ]
 
 if __name__ == '__main__':
     data_manager = DataManager('uploaded_files')
@@ -1,8 +1,8 @@
-from optapy import problem_fact, planning_id, planning_entity, planning_variable
+from optapy import problem_fact, planning_id, planning_entity, planning_variable, planning_pin
 from optapy import planning_solution, planning_entity_collection_property, \
                    problem_fact_collection_property, \
                    value_range_provider, planning_score
-from optapy.score import HardSoftScore
+from optapy.score import HardMediumSoftScore
 
 @problem_fact
 class StudentGroup:
@@ -21,17 +21,40 @@ class StudentGroup:
 
 
 
+@problem_fact
+class StudentGroupConflict:
+    # Two student groups that share at least one student, stored once with group_id < other_group_id
+    def __init__(self, id, group_id, other_group_id, shared_students):
+        self.id = id
+        self.group_id = group_id
+        self.other_group_id = other_group_id
+        self.shared_students = shared_students
+
+    @planning_id
+    def get_id(self):
+        return self.id
+
+    def __str__(self):
+        return f"StudentGroupConflict(id={self.id}, groups=({self.group_id}, {self.other_group_id}), shared={self.shared_students})"
+
+
 @problem_fact
 class Teacher:
-    def __init__(self, name, availability=None):
+    def __init__(self, id, name, availability_mask=0):
+        self.id = id
         self.name = name
-        self.availability = availability
+        # bit N is set when the teacher is available in the timeslot with id N
+        self.availability_mask = availability_mask
+
+    @planning_id
+    def get_id(self):
+        return self.id
 
     def is_available(self, timeslot):
-        return self.availability.get(timeslot.id, 0) == 1
+        return (self.availability_mask >> timeslot.id) & 1 == 1
 
     def __str__(self):
-        return f"Teacher(name={self.name})"
+        return f"Teacher(id={self.id}, name={self.name})"
     
 
 from optapy import problem_fact, planning_id
@@ -72,12 +95,33 @@ class Timeslot:
         )
 
 
+@problem_fact
+class ForbiddenTimeslot:
+    # The lesson with lesson_id must not be placed in the timeslot with timeslot_id
+    def __init__(self, id, lesson_id, timeslot_id):
+        self.id = id
+        self.lesson_id = lesson_id
+        self.timeslot_id = timeslot_id
+
+    @planning_id
+    def get_id(self):
+        return self.id
+
+    def __str__(self):
+        return f"ForbiddenTimeslot(id={self.id}, lesson_id={self.lesson_id}, timeslot_id={self.timeslot_id})"
+
+
 @planning_entity
 class Lesson:
-    def __init__(self, id, subject, teacher, student_group, student_group_capacity, group_intersection, timeslot=None, room=None, ideal_timeslot_id=None, ideal_room_id=None, forbidden_timeslots=None, is_fixed=False):
+    # Only ids, references to shared facts and the planning variables live here;
+    # lookup data (group conflicts, forbidden timeslots) is on the TimeTable.
+    def __init__(self, id, subject, teacher, student_group, student_group_capacity, timeslot=None, room=None, ideal_timeslot_id=None, ideal_room_id=None, is_fixed=False, is_pinned=False,
+                 timeslot_range=None, room_range=None):
         self.id = id
         self.subject = subject
         self.is_fixed = is_fixed
+        # Pinned lessons keep their timeslot and room, the solver never moves them
+        self.is_pinned = is_pinned
         self.teacher = teacher
         self.student_group = student_group
         self.student_group_capacity = student_group_capacity
@@ -85,10 +129,9 @@ class Lesson:
         self.room = room
         self.ideal_timeslot_id = ideal_timeslot_id
         self.ideal_room_id = ideal_room_id
-        self.forbidden_timeslots = forbidden_timeslots if forbidden_timeslots else {}
-        self.group_intersection = group_intersection
-
-
+        # Values this lesson may take, shared between lessons with the same domain
+        self.timeslot_range = timeslot_range
+        self.room_range = room_range
 
     def get_students(self):
         return self.student_group.students if self.student_group is not None else []
@@ -97,7 +140,19 @@ class Lesson:
     def get_id(self):
         return self.id
 
-    @planning_variable(Timeslot, value_range_provider_refs=["timeslotRange"], nullable=False)
+    @planning_pin
+    def get_is_pinned(self):
+        return self.is_pinned
+
+    @value_range_provider("lessonTimeslotRange", Timeslot)
+    def get_timeslot_range(self):
+        return self.timeslot_range
+
+    @value_range_provider("lessonRoomRange", Room)
+    def get_room_range(self):
+        return self.room_range
+
+    @planning_variable(Timeslot, value_range_provider_refs=["lessonTimeslotRange"], nullable=False)
     def get_timeslot(self):
       return self.timeslot
 
@@ -106,7 +161,7 @@ class Lesson:
     def set_timeslot(self, new_timeslot):
         self.timeslot = new_timeslot
 
-    @planning_variable(Room, ["roomRange"])
+    @planning_variable(Room, ["lessonRoomRange"])
     def get_room(self):
         return self.room
 
@@ -121,7 +176,7 @@ class Lesson:
             f"room={self.room}, "
             f"teacher={self.teacher.name}, "
             f"subject={self.subject}, "
-            f"ideal_timeslot={self.ideal_timeslot}, "
+            f"ideal_timeslot_id={self.ideal_timeslot_id}, "
             f"student_group={self.student_group}"
             f")"
         )
@@ -133,19 +188,22 @@ def format_list(a_list):
 
 @planning_solution
 class TimeTable:
-    def __init__(self, timeslot_list, room_list, lesson_list, score=None):
+    def __init__(self, timeslot_list, room_list, lesson_list, teacher_list=None, group_conflict_list=None,
+                 forbidden_timeslot_list=None, student_group_list=None, score=None):
         self.timeslot_list = timeslot_list
         self.room_list = room_list
         self.lesson_list = lesson_list
+        self.student_group_list = student_group_list if student_group_list is not None else []
+        self.teacher_list = teacher_list if teacher_list is not None else []
+        self.group_conflict_list = group_conflict_list if group_conflict_list is not None else []
+        self.forbidden_timeslot_list = forbidden_timeslot_list if forbidden_timeslot_list is not None else []
         self.score = score
 
     @problem_fact_collection_property(Timeslot)
-    @value_range_provider("timeslotRange")
     def get_timeslot_list(self):
         return self.timeslot_list
 
     @problem_fact_collection_property(Room)
-    @value_range_provider("roomRange")
     def get_room_list(self):
         return self.room_list
 
@@ -153,18 +211,25 @@ class TimeTable:
     def get_lesson_list(self):
         return self.lesson_list
 
+    @problem_fact_collection_property(Teacher)
+    def get_teacher_list(self):
+        return self.teacher_list
+
+    @problem_fact_collection_property(StudentGroupConflict)
+    def get_group_conflict_list(self):
+        return self.group_conflict_list
+
+    @problem_fact_collection_property(ForbiddenTimeslot)
+    def get_forbidden_timeslot_list(self):
+        return self.forbidden_timeslot_list
+
     @problem_fact_collection_property(StudentGroup)
     def get_student_group_list(self):
-        covered_group_ids = []
-        group_list = []
-        for lesson in self.lesson_list:
-            if lesson.student_group.id not in covered_group_ids:
-                group_list.append(lesson.student_group)
-                covered_group_ids.append(lesson.student_group.id)
-
-        return group_list
+        # Built once with the problem, this is called on every solution clone
+        return self.student_group_list
 
-    @planning_score(HardSoftScore)
+    # hard: conflicts, medium: lessons in forbidden timeslots, soft: lessons moved from the existing schedule
+    @planning_score(HardMediumSoftScore)
     def get_score(self):
         return self.score
 
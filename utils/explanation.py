@@ -0,0 +1,77 @@
+import weakref
+import pandas as pd
+
+from .entities import Lesson
+from .profiling import get_constraint_match_totals
+
+# Explaining replays every constraint match on the JVM, so each solution is explained once
+_score_reports = weakref.WeakKeyDictionary()
+
+
+class ScoreReport:
+    # constraint_totals: one row per constraint
+    # conflicts: one row per constraint match, with the lessons it involves (other_lesson_id is None for single-lesson matches)
+    # indictments: one row per lesson with any match, listing the lessons it conflicts with
+    def __init__(self, score, constraint_totals, conflicts):
+        self.score = score
+        self.constraint_totals = constraint_totals
+        self.conflicts = conflicts
+        self.indictments = self._build_indictments(conflicts)
+
+    @staticmethod
+    def _build_indictments(conflicts):
+        # Each pair shows up under both of its lessons
+        both_sides = pd.concat([
+            conflicts[['lesson_id', 'other_lesson_id', 'constraint']],
+            conflicts[conflicts['other_lesson_id'].notna()]
+                .rename(columns={'lesson_id': 'other_lesson_id', 'other_lesson_id': 'lesson_id'})
+                [['lesson_id', 'other_lesson_id', 'constraint']],
+        ], ignore_index=True)
+        grouped = both_sides.groupby('lesson_id')
+        indictments = pd.DataFrame({
+            'match_count': grouped.size(),
+            'constraints': grouped['constraint'].agg(lambda names: sorted(set(names))),
+            'conflicting_lesson_ids': grouped['other_lesson_id'].agg(
+                lambda ids: sorted({int(lesson_id) for lesson_id in ids.dropna()})),
+        })
+        return indictments.reset_index().sort_values(['match_count', 'lesson_id'], ascending=[False, True], ignore_index=True)
+
+    def lesson_conflicts(self, lesson_id):
+        return self.conflicts[(self.conflicts['lesson_id'] == lesson_id) | (self.conflicts['other_lesson_id'] == lesson_id)]
+
+
+def _justified_lessons(constraint_match):
+    # Justifications come back as Java wrappers around the Python facts and entities
+    lessons = []
+    for justification in constraint_match.getJustificationList():
+        value = justification.get__optapy_Id() if hasattr(justification, 'get__optapy_Id') else justification
+        if isinstance(value, Lesson):
+            lessons.append(value)
+    return lessons
+
+
+def explain_solution(solution, score_manager):
+    if solution in _score_reports:
+        return _score_reports[solution]
+
+    explanation = score_manager.explainScore(solution)
+    records = []
+    for match_total in explanation.getConstraintMatchTotalMap().values():
+        constraint = str(match_total.getConstraintName())
+        for constraint_match in match_total.getConstraintMatchSet():
+            lesson_ids = sorted(lesson.id for lesson in _justified_lessons(constraint_match))
+            if not lesson_ids:
+                continue
+            records.append({
+                'constraint': constraint,
+                'score': str(constraint_match.getScore()),
+                'lesson_id': lesson_ids[0],
+                'other_lesson_id': lesson_ids[1] if len(lesson_ids) > 1 else None,
+            })
+
+    conflicts = pd.DataFrame(records, columns=['constraint', 'score', 'lesson_id', 'other_lesson_id'])
+    conflicts['other_lesson_id'] = conflicts['other_lesson_id'].astype('Int64')
+    conflicts = conflicts.sort_values(['constraint', 'lesson_id', 'other_lesson_id'], ignore_index=True)
+    report = ScoreReport(str(explanation.getScore()), get_constraint_match_totals(explanation), conflicts)
+    _score_reports[solution] = report
+    return report
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import maximum_bipartite_matching
+
+from .preprocessing import build_group_incidence
+from .time_utils import get_timeslot_list
+
+
+class FeasibilityIssue:
+    # One reason the input can't be scheduled as given, with the lessons behind it. Blocking issues
+    # are provable conflicts; the others are warnings, solving goes on without those lessons.
+    def __init__(self, check, name, message, lesson_ids, blocking=True):
+        self.check = check
+        self.name = name
+        self.message = message
+        self.lesson_ids = list(lesson_ids)
+        self.blocking = blocking
+
+    def __str__(self):
+        return f'{self.check}: {self.name}: {self.message}'
+
+
+def analyze_feasibility(data_manager):
+    # Counting and matching bounds over the DataManager tables, no solver involved
+    timeslot_ids = [timeslot.id for timeslot in get_timeslot_list()]
+    lessons_df = data_manager.input_lessons_df
+    lessons_df = lessons_df[lessons_df['student_group_capacity'].notna()]
+    availability = {
+        name: [timeslot_id for timeslot_id in timeslot_ids if (mask >> timeslot_id) & 1]
+        for name, mask in data_manager.teachers_availability_mask.items()
+    }
+
+    issues = []
+    issues += _check_unknown_teachers(lessons_df, availability)
+    lessons_df = lessons_df[lessons_df['teacher'].isin(availability)]
+    issues += _check_teacher_load(lessons_df, availability)
+    issues += _check_group_load(lessons_df, len(timeslot_ids))
+    issues += _check_room_sizes(lessons_df, data_manager.input_audiences_df, len(timeslot_ids))
+    issues += _check_student_matching(lessons_df, data_manager.input_students_df, availability, timeslot_ids)
+    return issues
+
+
+def blocking_issues(issues):
+    return [issue for issue in issues if issue.blocking]
+
+
+def issues_to_frame(issues):
+    return pd.DataFrame(
+        [(issue.check, issue.name, issue.message, issue.lesson_ids, issue.blocking) for issue in issues],
+        columns=['check', 'name', 'message', 'lesson_ids', 'blocking'],
+    )
+
+
+def _check_unknown_teachers(lessons_df, availability):
+    unknown = lessons_df[~lessons_df['teacher'].isin(availability)]
+    return [
+        FeasibilityIssue('unknown teacher', teacher, 'not in the teachers sheet, these lessons are skipped', rows['id'],
+                         blocking=False)
+        for teacher, rows in unknown.groupby('teacher')
+    ]
+
+
+def _check_teacher_load(lessons_df, availability):
+    issues = []
+    for teacher, rows in lessons_df.groupby('teacher'):
+        if rows.shape[0] > len(availability[teacher]):
+            issues.append(FeasibilityIssue(
+                'teacher overloaded', teacher,
+                f'{rows.shape[0]} lessons but available in {len(availability[teacher])} timeslots', rows['id']))
+    return issues
+
+
+def _check_group_load(lessons_df, num_timeslots):
+    issues = []
+    for group, rows in lessons_df.groupby('group'):
+        if rows.shape[0] > num_timeslots:
+            issues.append(FeasibilityIssue(
+                'group overloaded', group, f'{rows.shape[0]} lessons in a {num_timeslots} timeslot week', rows['id']))
+    return issues
+
+
+def _check_room_sizes(lessons_df, audiences_df, num_timeslots):
+    issues = []
+    capacities = np.sort(audiences_df['capacity'].to_numpy())
+    too_big = lessons_df[lessons_df['student_group_capacity'] > (capacities[-1] if len(capacities) else 0)]
+    for group, rows in too_big.groupby('group'):
+        issues.append(FeasibilityIssue(
+            'no room fits', group,
+            f'{int(rows["student_group_capacity"].max())} students, the largest room holds {capacities[-1] if len(capacities) else 0}',
+            rows['id']))
+
+    # Lessons needing at least c seats share the rooms with capacity >= c, 30 times a week each
+    fitting = lessons_df[lessons_df['student_group_capacity'] <= (capacities[-1] if len(capacities) else 0)]
+    for capacity in np.unique(fitting['student_group_capacity'].to_numpy()):
+        rooms = len(capacities) - np.searchsorted(capacities, capacity)
+        rows = fitting[fitting['student_group_capacity'] >= capacity]
+        if rows.shape[0] > rooms * num_timeslots:
+            issues.append(FeasibilityIssue(
+                'not enough rooms', f'{int(capacity)}+ seats',
+                f'{rows.shape[0]} lessons for {rooms} rooms x {num_timeslots} timeslots', rows['id']))
+    return issues
+
+
+def _check_student_matching(lessons_df, students_df, availability, timeslot_ids):
+    # Every lesson of a student's groups needs its own timeslot, one the lesson's teacher is
+    # available in. Students with the same groups are checked once, by bipartite matching.
+    incidence, group_names = build_group_incidence(students_df)
+    timeslot_index = {timeslot_id: num for num, timeslot_id in enumerate(timeslot_ids)}
+    # Per group: its lesson ids, and for each lesson the timeslot columns it may use
+    group_lessons = {}
+    # Lessons whose teacher has no timeslot at all are already reported as teacher overload
+    lessons_df = lessons_df[lessons_df['teacher'].map(lambda teacher: len(availability[teacher]) > 0)]
+    for group, rows in lessons_df.groupby('group'):
+        lesson_slots = [[timeslot_index[slot] for slot in availability[teacher]] for teacher in rows['teacher']]
+        group_lessons[group] = (rows['id'].tolist(), [len(slots) for slots in lesson_slots],
+                                [slot for slots in lesson_slots for slot in slots])
+
+    issues = []
+    seen = set()
+    for student in range(incidence.shape[0]):
+        groups = tuple(group_names[num] for num in incidence.indices[incidence.indptr[student]:incidence.indptr[student + 1]]
+                       if group_names[num] in group_lessons)
+        if not groups or groups in seen:
+            continue
+        seen.add(groups)
+        lesson_ids = [lesson_id for group in groups for lesson_id in group_lessons[group][0]]
+        degrees = [degree for group in groups for degree in group_lessons[group][1]]
+        # Any lesson can take any free slot when there are no more lessons than slots each may use
+        if len(lesson_ids) <= min(degrees):
+            continue
+        slots = [slot for group in groups for slot in group_lessons[group][2]]
+
+        graph = sparse.csr_matrix((np.ones(len(slots), dtype=np.int8), (np.repeat(np.arange(len(lesson_ids)), degrees), slots)),
+                                  shape=(len(lesson_ids), len(timeslot_ids)))
+        matched = int((maximum_bipartite_matching(graph, perm_type='column') >= 0).sum())
+        if matched < len(lesson_ids):
+            issues.append(FeasibilityIssue(
+                'student overloaded', students_df['name'].iloc[student],
+                f'{len(lesson_ids)} lessons across {len(groups)} groups fit into at most {matched} distinct '
+                f'timeslots the teachers are available in', lesson_ids))
+    return issues
+
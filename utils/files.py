@@ -1,7 +1,30 @@
 import os
+import re
+import hashlib
+import tempfile
+import openpyxl
+import numpy as np
 import pandas as pd
 from loguru import logger
-from io import StringIO
+from io import StringIO, BytesIO
+from collections import OrderedDict
+
+WORKBOOK_HASH_FILE = '.workbook_hash'
+MAX_PARSED_WORKBOOKS = 4
+# Exported workbooks stay in memory up to this size, then roll over to a temp file
+MAX_EXPORT_MEMORY_BYTES = 16 * 2 ** 20
+MAX_SHEET_TITLE_LENGTH = 31
+SCHEDULE_SHEET_PREFIXES = {'room': 'Room', 'teacher': 'Teacher', 'group': 'Group'}
+
+# content hash -> UploadedWorkbook; Streamlit keeps the module loaded between reruns
+_parsed_workbooks = OrderedDict()
+
+
+class UploadedWorkbook:
+    def __init__(self, content_hash, frames):
+        self.content_hash = content_hash
+        self.frames = frames
+
 
 def convert_df_to_csv(df):
     # Convert DataFrame to CSV
@@ -9,18 +32,136 @@ def convert_df_to_csv(df):
     df.to_csv(output, index=False)
     return output.getvalue()
 
-def process_file(uploaded_file, save_dir):
-    # Create a directory to save files
+def _unique_columns(header):
+    # Same names pd.read_excel would give: "Unnamed: N" for empty headers, ".1", ".2" for duplicates
+    columns = []
+    seen = {}
+    for num, name in enumerate(header):
+        name = f'Unnamed: {num}' if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def _sheet_to_frame(sheet):
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+
+    columns = _unique_columns(header)
+    width = len(columns)
+    records = [
+        tuple(row[:width]) + (None,) * (width - len(row))
+        for row in rows
+        if any(v is not None for v in row)
+    ]
+    df = pd.DataFrame.from_records(records, columns=columns).infer_objects()
+    # Fully empty columns come back as object/None, pd.read_csv gives float NaN
+    return df.astype({c: float for c in df.columns if df[c].isna().all()})
+
+def read_workbook_frames(content):
+    workbook = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        return {sheet_name: _sheet_to_frame(workbook[sheet_name]) for sheet_name in workbook.sheetnames}
+    finally:
+        workbook.close()
+
+def read_uploaded_workbook(uploaded_file):
+    content = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else uploaded_file.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    if content_hash in _parsed_workbooks:
+        _parsed_workbooks.move_to_end(content_hash)
+        return _parsed_workbooks[content_hash]
+
+    workbook = UploadedWorkbook(content_hash, read_workbook_frames(content))
+    logger.debug(f"Parsed workbook {content_hash[:12]} with sheets {list(workbook.frames)}")
+    _parsed_workbooks[content_hash] = workbook
+    while len(_parsed_workbooks) > MAX_PARSED_WORKBOOKS:
+        _parsed_workbooks.popitem(last=False)
+    return workbook
+
+def save_workbook(workbook, save_dir):
+    # Keep a CSV copy on disk for later sessions, written once per distinct upload
+    hash_path = os.path.join(save_dir, WORKBOOK_HASH_FILE)
+    if os.path.exists(hash_path):
+        with open(hash_path) as f:
+            if f.read().strip() == workbook.content_hash:
+                return
+
     os.makedirs(save_dir, exist_ok=True)
+    for sheet_name, df in workbook.frames.items():
+        save_path = os.path.join(save_dir, f"{sheet_name}.csv")
+        df.to_csv(save_path, index=False)
+        logger.debug(f"Saved {sheet_name} to {save_path}")
+
+    with open(hash_path, 'w') as f:
+        f.write(workbook.content_hash)
+
+def process_file(uploaded_file, save_dir):
+    workbook = read_uploaded_workbook(uploaded_file)
+    save_workbook(workbook, save_dir)
+    return workbook
+
+def _sheet_title(name, used_titles):
+    # Excel titles: at most 31 characters, none of []:*?/\ and unique ignoring case
+    title = re.sub(r'[\[\]:*?/\\]', ' ', name).strip()[:MAX_SHEET_TITLE_LENGTH]
+    candidate, num = title, 1
+    while candidate.lower() in used_titles:
+        num += 1
+        suffix = f' ({num})'
+        candidate = title[:MAX_SHEET_TITLE_LENGTH - len(suffix)] + suffix
+    used_titles.add(candidate.lower())
+    return candidate
+
+def _write_sheet(workbook, title, df):
+    # Write-only sheets stream rows to their own temp file, closing releases it until the workbook is saved
+    sheet = workbook.create_sheet(title)
+    sheet.append([str(column) for column in df.columns])
+    for row in df.to_numpy(dtype=object).tolist():
+        sheet.append([_cell_value(value) for value in row])
+    sheet.close()
+
+def _cell_value(value):
+    if value is None or isinstance(value, str):
+        return value
+    if pd.isna(value):
+        return None
+    if isinstance(value, (int, float, np.number)):
+        return value.item() if isinstance(value, np.number) else value
+    return str(value)
+
+def schedule_csv_files(schedule_manager):
+    # File name -> CSV text for the schedule views and its score report
+    score_report = schedule_manager.score_report
+    raw_schedule_df = schedule_manager.raw_schedule_df
+    return {
+        'raw_schedule.csv': convert_df_to_csv(raw_schedule_df),
+        'pretty_schedule.csv': convert_df_to_csv(schedule_manager.raw_schedule_to_pretty(raw_schedule_df)),
+        'teacher_schedule.csv': convert_df_to_csv(schedule_manager.view('teacher')),
+        'group_schedule.csv': convert_df_to_csv(schedule_manager.view('group')),
+        'constraint_totals.csv': convert_df_to_csv(score_report.constraint_totals),
+        'conflicts.csv': convert_df_to_csv(score_report.conflicts),
+        'indictments.csv': convert_df_to_csv(score_report.indictments),
+    }
+
+def write_schedule_workbook(schedule_manager, raw_schedule_df=None):
+    # One workbook: the raw table, then a weekly grid per room, teacher and student group.
+    # Returns a spooled file positioned at the start.
+    raw_schedule_df = schedule_manager.raw_schedule_df if raw_schedule_df is None else raw_schedule_df
+    workbook = openpyxl.Workbook(write_only=True)
+    used_titles = set()
+    _write_sheet(workbook, _sheet_title('Raw schedule', used_titles), raw_schedule_df)
+    for by, prefix in SCHEDULE_SHEET_PREFIXES.items():
+        for name, timetable_df in schedule_manager.timetables(by, raw_schedule_df):
+            _write_sheet(workbook, _sheet_title(f'{prefix} {name}', used_titles), timetable_df)
 
-    # Read the Excel file (all sheets)
-    with pd.ExcelFile(uploaded_file) as xls:
-        for sheet_name in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name)
-            
-            # Construct the filename for each sheet
-            save_path = os.path.join(save_dir, f"{sheet_name}.csv")
-            
-            # Save each sheet as a CSV file
-            df.to_csv(save_path, index=False)
-            logger.debug(f"Saved {sheet_name} to {save_path}")
\ No newline at end of file
+    output = tempfile.SpooledTemporaryFile(max_size=MAX_EXPORT_MEMORY_BYTES)
+    workbook.save(output)
+    output.seek(0)
+    logger.debug(f"Wrote schedule workbook with {len(used_titles)} sheets")
+    return output
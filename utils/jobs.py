@@ -0,0 +1,121 @@
+import time
+import uuid
+import threading
+from loguru import logger
+
+from .termination import fixed_policy, TERMINATION_EARLY
+
+JOB_SOLVING = 'SOLVING'
+JOB_FINISHED = 'FINISHED'
+JOB_FAILED = 'FAILED'
+MAX_FINISHED_JOBS = 16
+
+
+class SolveJob:
+    def __init__(self, job_id, termination, solver_manager):
+        self.job_id = job_id
+        self.termination = termination
+        self.solver_manager = solver_manager
+        # The Java SolverJob, set once solveAndListen returns
+        self.solver_job = None
+        # Solving time as the solver measured it, without the time spent queued
+        self.time_spent_ms = None
+        self.termination_reason = None
+        self.terminated_early = False
+        self.status = JOB_SOLVING
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.best_solution = None
+        # (seconds since start, score) for every new best solution
+        self.score_history = []
+        self.error = None
+        # Whatever the caller builds from the final solution, kept so reruns don't rebuild it
+        self.result = None
+        self.lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def best_score(self):
+        return self.score_history[-1][1] if self.score_history else None
+
+    @property
+    def done(self):
+        return self.status != JOB_SOLVING
+
+
+class SolveJobManager:
+    # Solves in SolverManager threads, so a Streamlit rerun never waits for or restarts a solve
+    def __init__(self, solver_registry):
+        self.solver_registry = solver_registry
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, problem, termination=None):
+        # One solver manager per termination policy, shared through the registry and released when the job ends
+        termination = termination if termination is not None else fixed_policy()
+        solver_manager = self.solver_registry.solver_manager(termination=termination)
+        job_id = uuid.uuid4().hex
+        job = SolveJob(job_id, termination, solver_manager)
+        with self.lock:
+            self.jobs[job_id] = job
+            self._prune_jobs()
+
+        solver_job = solver_manager.solveAndListen(
+            job_id, problem,
+            lambda solution: self._on_best_solution(job, solution),
+            lambda solution: self._on_final_solution(job, solution),
+            lambda problem_id, exception: self._on_exception(job, exception),
+        )
+        with job.lock:
+            job.solver_job = solver_job
+        logger.debug(f'Submitted solve job {job_id} with {termination}')
+        return job_id
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def terminate(self, job_id):
+        job = self.jobs[job_id]
+        job.terminated_early = True
+        job.solver_manager.terminateEarly(job_id)
+
+    def _on_best_solution(self, job, solution):
+        with job.lock:
+            job.best_solution = solution
+            job.score_history.append((round(job.elapsed, 1), str(solution.get_score())))
+
+    def _on_final_solution(self, job, solution):
+        with job.lock:
+            job.best_solution = solution
+            if not job.score_history or job.score_history[-1][1] != str(solution.get_score()):
+                job.score_history.append((round(job.elapsed, 1), str(solution.get_score())))
+            job.finished_at = time.monotonic()
+            job.status = JOB_FINISHED
+            if job.solver_job is not None:
+                job.time_spent_ms = int(job.solver_job.getSolvingDuration().toMillis())
+            if job.terminated_early:
+                job.termination_reason = TERMINATION_EARLY
+            else:
+                # The listener only gets solutions, not the solver's best solution time
+                job.termination_reason = job.termination.termination_reason(job.best_score, job.time_spent_ms)
+        self.solver_registry.release_solver_manager(termination=job.termination)
+        logger.debug(f'Solve job {job.job_id} finished with {job.best_score}, stopped by {job.termination_reason}')
+
+    def _on_exception(self, job, exception):
+        with job.lock:
+            job.error = str(exception)
+            job.finished_at = time.monotonic()
+            job.status = JOB_FAILED
+        self.solver_registry.release_solver_manager(termination=job.termination)
+        logger.error(f'Solve job {job.job_id} failed: {exception}')
+
+    def _prune_jobs(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job.job_id]
+
@@ -0,0 +1,138 @@
+import os
+import multiprocessing
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+
+from .entities import TimeTable
+
+
+def find_lesson_components(problem):
+    # Lessons are connected when they share a teacher or a group, or their groups share students.
+    # Graph nodes are lessons, then teachers, then groups; returns a component label per lesson.
+    lessons = problem.lesson_list
+    teacher_index = {teacher.id: num for num, teacher in enumerate(problem.teacher_list)}
+    group_index = {group.id: num for num, group in enumerate(problem.student_group_list)}
+    num_lessons, num_teachers = len(lessons), len(teacher_index)
+    num_nodes = num_lessons + num_teachers + len(group_index)
+
+    lesson_nodes = np.arange(num_lessons)
+    teacher_nodes = num_lessons + np.array([teacher_index[lesson.teacher.id] for lesson in lessons], dtype=int)
+    group_nodes = num_lessons + num_teachers + np.array([group_index[lesson.student_group.id] for lesson in lessons], dtype=int)
+    conflicts = [(conflict.group_id, conflict.other_group_id) for conflict in problem.group_conflict_list
+                 if conflict.group_id in group_index and conflict.other_group_id in group_index]
+    conflict_a = num_lessons + num_teachers + np.array([group_index[a] for a, _ in conflicts], dtype=int)
+    conflict_b = num_lessons + num_teachers + np.array([group_index[b] for _, b in conflicts], dtype=int)
+
+    rows = np.concatenate([lesson_nodes, lesson_nodes, conflict_a])
+    cols = np.concatenate([teacher_nodes, group_nodes, conflict_b])
+    graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(num_nodes, num_nodes))
+    _, labels = connected_components(graph, directed=False)
+    # Renumber so lesson components are 0..n-1
+    _, lesson_labels = np.unique(labels[:num_lessons], return_inverse=True)
+    return lesson_labels
+
+
+def group_components(lesson_labels, max_parts):
+    # Packs components into at most max_parts bins of similar lesson count, largest first
+    sizes = np.bincount(lesson_labels)
+    bins = [[] for _ in range(min(max_parts, len(sizes)))]
+    bin_sizes = [0] * len(bins)
+    for label in np.argsort(-sizes):
+        smallest = int(np.argmin(bin_sizes))
+        bins[smallest].append(int(label))
+        bin_sizes[smallest] += int(sizes[label])
+    part_of_label = np.empty(len(sizes), dtype=int)
+    for part, labels in enumerate(bins):
+        part_of_label[labels] = part
+    return part_of_label[lesson_labels]
+
+
+def split_problem(problem, lesson_parts):
+    # One TimeTable per part with only the facts its lessons use; timeslots and rooms are shared by all
+    parts = []
+    for part in range(int(lesson_parts.max()) + 1 if len(lesson_parts) else 0):
+        lessons = [lesson for lesson, lesson_part in zip(problem.lesson_list, lesson_parts) if lesson_part == part]
+        lesson_ids = {lesson.id for lesson in lessons}
+        teacher_ids = {lesson.teacher.id for lesson in lessons}
+        group_ids = {lesson.student_group.id for lesson in lessons}
+        parts.append(TimeTable(
+            problem.timeslot_list, problem.room_list, lessons,
+            [teacher for teacher in problem.teacher_list if teacher.id in teacher_ids],
+            [conflict for conflict in problem.group_conflict_list
+             if conflict.group_id in group_ids and conflict.other_group_id in group_ids],
+            [forbidden for forbidden in problem.forbidden_timeslot_list if forbidden.lesson_id in lesson_ids],
+            [group for group in problem.student_group_list if group.id in group_ids],
+        ))
+    return parts
+
+
+def _solve_part(problem, termination):
+    # Runs in a worker process with its own JVM; only plain ids go back to the parent
+    from .solvers import get_solver_registry
+    solution = get_solver_registry().build_solver(termination=termination).solve(problem)
+    return str(solution.get_score()), [
+        (lesson.id, lesson.timeslot.id if lesson.timeslot is not None else None,
+         lesson.room.id if lesson.room is not None else None)
+        for lesson in solution.get_lesson_list()
+    ]
+
+
+def repair_rooms(problem):
+    # Parts are solved independently, so two lessons from different parts can end up in the
+    # same room at the same time. Moves the later one to the smallest free room that fits.
+    # Returns the lessons that could not be moved.
+    rooms = sorted(problem.room_list, key=lambda room: room.capacity)
+    occupied = {}
+    unresolved = []
+    # Pinned lessons keep their room, the rest go in by group size so big groups pick first
+    ordered = sorted(problem.lesson_list, key=lambda lesson: (not lesson.is_pinned, -lesson.student_group_capacity))
+    for lesson in ordered:
+        if lesson.timeslot is None or lesson.room is None:
+            continue
+        key = (lesson.timeslot.id, lesson.room.id)
+        if key not in occupied:
+            occupied[key] = lesson
+            continue
+        free_room = next((room for room in rooms
+                          if room.capacity >= lesson.student_group_capacity
+                          and (lesson.timeslot.id, room.id) not in occupied), None)
+        if free_room is None or lesson.is_pinned:
+            unresolved.append(lesson)
+            continue
+        lesson.set_room(free_room)
+        occupied[(lesson.timeslot.id, free_room.id)] = lesson
+    return unresolved
+
+
+def solve_partitioned(problem, termination=None, max_workers=None):
+    # Solves the independent parts of problem in parallel and writes the assignments back into it
+    max_workers = max_workers or os.cpu_count() or 1
+    lesson_labels = find_lesson_components(problem)
+    lesson_parts = group_components(lesson_labels, max_workers)
+    parts = split_problem(problem, lesson_parts)
+    logger.debug(f'{lesson_labels.max() + 1 if len(lesson_labels) else 0} independent components '
+                 f'solved as {len(parts)} parts of {[len(part.lesson_list) for part in parts]} lessons')
+
+    lesson_by_id = {lesson.id: lesson for lesson in problem.lesson_list}
+    timeslot_by_id = {timeslot.id: timeslot for timeslot in problem.timeslot_list}
+    room_by_id = {room.id: room for room in problem.room_list}
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(parts)) or 1, mp_context=context) as executor:
+        futures = [executor.submit(_solve_part, part, termination) for part in parts]
+        part_scores = []
+        for future in futures:
+            score, assignments = future.result()
+            part_scores.append(score)
+            for lesson_id, timeslot_id, room_id in assignments:
+                lesson = lesson_by_id[lesson_id]
+                lesson.set_timeslot(timeslot_by_id.get(timeslot_id))
+                lesson.set_room(room_by_id.get(room_id))
+
+    unresolved = repair_rooms(problem)
+    if unresolved:
+        logger.warning(f'Room repair left {len(unresolved)} lessons without a free room: {[lesson.id for lesson in unresolved]}')
+    return problem, part_scores, unresolved
@@ -1,18 +1,104 @@
-from collections import defaultdict
+import numpy as np
+import pandas as pd
+from scipy import sparse
 
 def strip_whitespace(x):
     if isinstance(x, str):
         return x.lstrip().rstrip()
     return x
 
-def get_group_intersections(students_df):
-    group_intersection = defaultdict(dict)
 
-    required_columns = [c for c in students_df.columns.values[3:].tolist() if c not in ['id', 'name']]
+def to_group_name(x):
+    # Workbooks give numeric group names as numbers, floats when the column has empty cells
+    if x is None or (isinstance(x, (float, np.floating)) and np.isnan(x)):
+        return np.nan
+    if isinstance(x, (float, np.floating)) and float(x).is_integer():
+        return str(int(x))
+    return str(x)
+
+
+class GroupIntersections:
+    # Integer-indexed group overlap graph. Group ids are the columns of the
+    # student x group incidence matrix, shared_students[a, b] is the number of
+    # students attending both group a and group b (diagonal is dropped).
+    def __init__(self, group_names, shared_students):
+        self.group_names = list(group_names)
+        self.group_index = {name: num for num, name in enumerate(self.group_names)}
+        self.shared_students = shared_students.tocsr()
+
+    def __len__(self):
+        return len(self.group_names)
+
+    def neighbours(self, group_id):
+        # Groups added after the matrix was built (e.g. scaled copies) share no students
+        if not 0 <= group_id < self.shared_students.shape[0]:
+            return np.empty(0, dtype=self.shared_students.indices.dtype)
+        start, end = self.shared_students.indptr[group_id], self.shared_students.indptr[group_id + 1]
+        return self.shared_students.indices[start:end]
+
+    def intersects(self, group_name_a, group_name_b):
+        return self.shared_count(group_name_a, group_name_b) > 0
+
+    def shared_count(self, group_name_a, group_name_b):
+        a = self.group_index.get(group_name_a)
+        b = self.group_index.get(group_name_b)
+        if a is None or b is None:
+            return 0
+        return int(self.shared_students[a, b])
+
+    def pairs(self):
+        # Each intersecting pair once, as (group_id_a, group_id_b, shared) with a < b
+        upper = sparse.triu(self.shared_students, k=1).tocoo()
+        return upper.row, upper.col, upper.data
+
+    def to_frame(self):
+        # Each intersecting pair once by name, as ScheduleStore.save takes them
+        rows, cols, shared = self.pairs()
+        names = np.array(self.group_names, dtype=object)
+        return pd.DataFrame({'student_group': names[rows], 'other_group': names[cols],
+                             'shared_students': shared.astype(np.int64)})
+
+    def to_dict(self):
+        # Legacy {group_name: {group_name: 1}} view
+        return {
+            name: {self.group_names[other]: 1 for other in self.neighbours(num)}
+            for num, name in enumerate(self.group_names)
+            if len(self.neighbours(num))
+        }
 
-    for subject in required_columns:
-        for group in students_df[subject].dropna().unique():
-            group_df = students_df[students_df[subject] == group]
-            for subject_2 in [s for s in required_columns if s != subject]:
-                group_intersection[group].update({v: 1 for v in group_df[subject_2].dropna().unique()})
-    return group_intersection
\ No newline at end of file
+
+def get_group_columns(students_df):
+    return [c for c in students_df.columns.values[3:].tolist() if c not in ['id', 'name']]
+
+
+def build_group_incidence(students_df):
+    # One pass over the subject columns: (student row, group name) pairs -> sparse 0/1 matrix
+    required_columns = get_group_columns(students_df)
+    values = students_df[required_columns].to_numpy(dtype=object)
+    rows, cols = np.nonzero(pd.notna(values))
+    group_codes, group_names = pd.factorize(values[rows, cols])
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, group_codes)),
+        shape=(students_df.shape[0], len(group_names))
+    )
+    # The same group can appear in several subject columns for one student
+    incidence.data[:] = 1
+    return incidence, list(group_names)
+
+
+def get_enrollment_counts(students_df):
+    # (subject column, group) -> number of students, from one pass over the subject columns
+    required_columns = get_group_columns(students_df)
+    values = students_df[required_columns].to_numpy(dtype=object)
+    rows, cols = np.nonzero(pd.notna(values))
+    enrollments = pd.DataFrame({'subject': np.asarray(required_columns, dtype=object)[cols], 'group': values[rows, cols]})
+    return enrollments.groupby(['subject', 'group']).size()
+
+
+def get_group_intersections(students_df):
+    incidence, group_names = build_group_incidence(students_df)
+    shared_students = (incidence.T @ incidence).tocsr()
+    shared_students = shared_students - sparse.diags(shared_students.diagonal(), dtype=shared_students.dtype)
+    shared_students.eliminate_zeros()
+    return GroupIntersections(group_names, shared_students)
@@ -0,0 +1,58 @@
+import time
+import functools
+import pandas as pd
+from collections import defaultdict
+
+
+class CallbackProfiler:
+    # Counts and times the Python callbacks OptaPlanner makes while scoring
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def wrap(self, name, function):
+        # functools.wraps keeps the signature optapy inspects to pick the joiner/filter arity
+        @functools.wraps(function)
+        def profiled(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.calls[name] += 1
+                self.seconds[name] += time.perf_counter() - start
+        return profiled
+
+    def reset(self):
+        self.calls.clear()
+        self.seconds.clear()
+
+    def to_frame(self):
+        df = pd.DataFrame({
+            'callback': list(self.calls),
+            'calls': [self.calls[name] for name in self.calls],
+            'total_ms': [self.seconds[name] * 1000 for name in self.calls],
+        }, columns=['callback', 'calls', 'total_ms'])
+        df['constraint'] = df['callback'].str.split('.').str[0]
+        df['mean_us'] = df['total_ms'] * 1000 / df['calls'].clip(lower=1)
+        return df.sort_values('total_ms', ascending=False).reset_index(drop=True)
+
+
+def get_solver_statistics(solver):
+    solver_scope = solver.getSolverScope()
+    return {
+        'time_spent_ms': int(solver_scope.getTimeMillisSpent()),
+        'best_solution_time_ms': int(solver_scope.getBestSolutionTimeMillisSpent()),
+        'score_calculation_count': int(solver_scope.getScoreCalculationCount()),
+        'score_calculation_speed': int(solver_scope.getScoreCalculationSpeed()),
+    }
+
+
+def get_constraint_match_totals(explanation):
+    records = []
+    for match_total in explanation.getConstraintMatchTotalMap().values():
+        records.append({
+            'constraint': str(match_total.getConstraintName()),
+            'match_count': int(match_total.getConstraintMatchCount()),
+            'score': str(match_total.getScore()),
+        })
+    return pd.DataFrame(records, columns=['constraint', 'match_count', 'score'])
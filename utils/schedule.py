@@ -1,62 +1,163 @@
+import re
+import numpy as np
 import pandas as pd
 from .time_utils import get_timeslot_list
+from .explanation import explain_solution
+
+DAYS_ORDER = ['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY']
+# View name -> raw schedule column that becomes the view's columns, and the fields shown in each cell
+VIEW_COLUMNS = {'room': 'room', 'teacher': 'teacher', 'group': 'student_group', 'day': 'day'}
+VIEW_TEXT_COLUMNS = {
+    'room': ['subject', 'student_group', 'teacher'],
+    'teacher': ['subject', 'student_group', 'room'],
+    'group': ['subject', 'teacher', 'room'],
+    'day': ['subject', 'student_group', 'teacher', 'room'],
+}
 
 class ScheduleManager:
 
-    def __init__(self, optapy_solution=None, raw_schedule_df=None):
+    def __init__(self, optapy_solution=None, raw_schedule_df=None, score_manager=None):
+        # score_report explains the solution's score per constraint and per lesson, keyed by lesson_id
+        self.score_report = None
+        # (content key of the raw schedule frame, its indexed copy) for the last frame rendered
+        self._indexed = (None, None)
         if optapy_solution != None:
             self.raw_schedule_df = self._parse_optapy_solution(optapy_solution)
+            if score_manager is not None:
+                self.score_report = explain_solution(optapy_solution, score_manager)
         else:
             self.raw_schedule_df = raw_schedule_df
-    
+
     def _parse_optapy_solution(self, solution):
-        scheduling_records_data = []
-        for num, l in enumerate(solution.get_lesson_list()):
-            scheduling_records_data.append({
-                'room': f"{l.room.name} [{l.room.capacity}]" ,
-                'student_group': f"{l.student_group.name}", # [{l.student_group_capacity}]",
-                'subject': l.subject,
-                'teacher': ' '.join(l.teacher.name.split(' ')[:2]),
-                'day': l.timeslot.day_of_week,
-                'start_time': l.timeslot.start_time,
-                'lesson_id': l.id,
-                'room_id': l.room.id,
-                'time_slot_id': l.timeslot.id,
-                'schedule_id': num
-            })
-
-        raw_schedule_df = pd.DataFrame(scheduling_records_data)
+        # Only integer ids are read per lesson, names and times come from the fact lists
+        lessons = solution.get_lesson_list()
+        count = len(lessons)
+        # One pass over the lessons, attribute access on planning entities is the slow part
+        table = np.array([(l.id, l.timeslot.id, l.room.id, l.teacher.id, l.student_group.id, l.subject) for l in lessons],
+                         dtype=object).reshape(count, 6)
+        lesson_ids, timeslot_ids, room_ids, teacher_ids, group_ids = table[:, :5].astype(np.int64).T
+        subjects = table[:, 5]
+
+        rooms = _lookup(solution.get_room_list(), lambda room: f"{room.name} [{room.capacity}]")
+        teachers = _lookup(solution.get_teacher_list(), lambda teacher: ' '.join(teacher.name.split(' ')[:2]))
+        groups = _lookup(solution.get_student_group_list(), lambda group: f"{group.name}")
+        timeslots = _lookup(solution.get_timeslot_list(), lambda timeslot: (timeslot.day_of_week, timeslot.start_time))
+        timeslot_positions = timeslots.index.get_indexer(timeslot_ids)
+
+        # Lessons are solved hardest first, the schedule lists them by id
+        order = np.argsort(lesson_ids, kind='stable')
+        raw_schedule_df = pd.DataFrame({
+            'room': rooms.to_numpy()[rooms.index.get_indexer(room_ids)],
+            'student_group': groups.to_numpy()[groups.index.get_indexer(group_ids)],
+            'subject': subjects,
+            'teacher': teachers.to_numpy()[teachers.index.get_indexer(teacher_ids)],
+            'day': [day for day, _ in timeslots.to_numpy()[timeslot_positions]],
+            'start_time': [start_time for _, start_time in timeslots.to_numpy()[timeslot_positions]],
+            'lesson_id': lesson_ids,
+            'room_id': room_ids,
+            'time_slot_id': timeslot_ids,
+        }).iloc[order].reset_index(drop=True)
+        raw_schedule_df['schedule_id'] = np.arange(count)
+        # Uploaded raw schedules pick lessons by this text, so it is part of the raw export
+        raw_schedule_df['text'] = _join_text(raw_schedule_df, VIEW_TEXT_COLUMNS['room'])
         return raw_schedule_df
-    
+
+    def _indexed_schedule(self, raw_schedule_df):
+        # One table all views are cut from: days as an ordered category, sorted by week time.
+        # Keyed on content, so a frame edited in place is indexed again.
+        key = _content_key(raw_schedule_df)
+        if self._indexed[0] != key:
+            schedule_df = raw_schedule_df.copy()
+            schedule_df['day'] = pd.Categorical(schedule_df['day'], categories=DAYS_ORDER, ordered=True)
+            schedule_df.sort_values(['day', 'start_time', 'schedule_id'], inplace=True, kind='stable')
+            self._indexed = (key, schedule_df)
+        return self._indexed[1]
+
+    def view(self, by, raw_schedule_df=None):
+        # Day and start time rows, one column per room/teacher/group; the day view has a column per day
+        schedule_df = self._indexed_schedule(self.raw_schedule_df if raw_schedule_df is None else raw_schedule_df)
+        text = _join_text(schedule_df, VIEW_TEXT_COLUMNS[by])
+        index = ['start_time'] if by == 'day' else ['day', 'start_time']
+        return _pivot(schedule_df, text, index, VIEW_COLUMNS[by])
+
+    def timetable(self, by, name, raw_schedule_df=None):
+        # Weekly grid for one room/teacher/group: start time rows, day columns
+        return next((df for _, df in self.timetables(by, raw_schedule_df, names={name})), None)
+
+    def timetables(self, by, raw_schedule_df=None, names=None):
+        # (name, weekly grid) for every room/teacher/group in name order, or only those in names.
+        # Grids share the schedule's start times and are built one at a time.
+        schedule_df = self._indexed_schedule(self.raw_schedule_df if raw_schedule_df is None else raw_schedule_df)
+        text = _join_text(schedule_df, VIEW_TEXT_COLUMNS[by]).to_numpy()
+        start_times = np.sort(schedule_df['start_time'].unique())
+        time_codes = np.searchsorted(start_times, schedule_df['start_time'].to_numpy())
+        day_codes = schedule_df['day'].cat.codes.to_numpy()
+        entity_codes, entity_names = pd.factorize(schedule_df[VIEW_COLUMNS[by]], sort=True)
+        order = np.argsort(entity_codes, kind='stable')
+        bounds = np.searchsorted(entity_codes[order], np.arange(len(entity_names) + 1))
+
+        for code, name in enumerate(entity_names):
+            if names is not None and name not in names:
+                continue
+            grid = np.full((len(start_times), len(DAYS_ORDER)), '', dtype=object)
+            for row in order[bounds[code]:bounds[code + 1]]:
+                cell = grid[time_codes[row], day_codes[row]]
+                # Clashing lessons share a cell
+                grid[time_codes[row], day_codes[row]] = f'{cell}\n\n{text[row]}' if cell else text[row]
+            df = pd.DataFrame(grid, columns=DAYS_ORDER, dtype=object)
+            df.insert(0, 'start_time', start_times)
+            yield name, df
+
     def raw_schedule_to_pretty(self, raw_schedule_df):
-        raw_schedule_df['text'] = raw_schedule_df.apply(lambda row: f"{row['subject']}\n{row['student_group']}\n{row['teacher']}\n[{row['schedule_id']}]", axis=1)
-        pivot_df = raw_schedule_df.pivot(index=['day', 'start_time'], columns='room', values='text')
+        # The room view builds its own cell text, raw_schedule_df is left as it is
+        return self.view('room', raw_schedule_df)
+
+
+def selected_lesson_id(raw_schedule_df, text):
+    # Schedule texts end in the row's schedule_id, which is not the lesson_id
+    schedule_id = int(re.search(r'\[([0-9]+)\]\s*$', text).group(1))
+    return int(raw_schedule_df.loc[raw_schedule_df['schedule_id'] == schedule_id, 'lesson_id'].item())
+
+
+def group_pairs_frame(solution):
+    # The solution's intersecting group pairs by name, as ScheduleStore.save takes them
+    groups = _lookup(solution.get_student_group_list(), lambda group: group.name)
+    conflicts = solution.get_group_conflict_list()
+    return pd.DataFrame({
+        'student_group': groups.reindex([conflict.group_id for conflict in conflicts]).to_numpy(),
+        'other_group': groups.reindex([conflict.other_group_id for conflict in conflicts]).to_numpy(),
+        'shared_students': [conflict.shared_students for conflict in conflicts],
+    }, columns=['student_group', 'other_group', 'shared_students'])
+
 
-        df = pivot_df.fillna('').copy()
-        df = df.reset_index()
-        days_order = ['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY']
-        df['day_int'] = df['day'].apply(lambda d: days_order.index(d))
-        df.sort_values(by=['day_int', 'start_time'], inplace=True)
-        df.drop('day_int', axis=1, inplace=True)
+def _lookup(facts, describe):
+    return pd.Series([describe(fact) for fact in facts], index=pd.Index([fact.id for fact in facts]), dtype=object)
 
-        # raw_schedule_df['text'] = raw_schedule_df.apply(lambda row: f"{row['subject']}\n{row['student_group']}\n{row['teacher']}\n[{row['schedule_id']}]", axis=1)
 
-        # unique_rooms = raw_schedule_df['room'].unique()
+def _content_key(schedule_df):
+    return tuple(schedule_df.columns), int(pd.util.hash_pandas_object(schedule_df).sum())
 
 
-        # # Convert start_time to a string format for MultiIndex compatibility
-        # raw_schedule_df['start_time'] = raw_schedule_df['start_time'].apply(lambda t: t.strftime('%H:%M'))
+def _join_text(schedule_df, columns):
+    text = schedule_df[columns[0]].astype(str)
+    for column in columns[1:]:
+        text = text + '\n' + schedule_df[column].astype(str)
+    return text + '\n[' + schedule_df['schedule_id'].astype(str) + ']'
 
-        # # Create a pivot table with 'day' and 'start_time' as index, rooms as columns, using 'text' for values
-        # pivot_df = raw_schedule_df.pivot(index=['day', 'start_time'], columns='room', values='text')
 
-        # pivot_df.columns = unique_rooms
-        # df = pivot_df.copy()
-        # df = df.fillna('')
-        # df = df.reset_index()
+def _pivot(schedule_df, text, index, column):
+    # schedule_df is sorted by week time, so rows come out in week order; days sort by category
+    row_codes, row_keys = pd.MultiIndex.from_arrays([schedule_df[name] for name in index]).factorize()
+    column_codes, column_keys = pd.factorize(schedule_df[column], sort=True)
+    cells = {}
+    for cell, value in zip((row_codes * len(column_keys) + column_codes).tolist(), text.tolist()):
+        # Clashing lessons share a cell
+        cells[cell] = f'{cells[cell]}\n\n{value}' if cell in cells else value
 
-        # days_order = ['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY']
-        # df['day_int'] = df['day'].apply(lambda d: days_order.index(d))
-        # df.sort_values(by=['day_int', 'start_time'], inplace=True)
-        # df.drop('day_int', axis=1, inplace=True)
-        return df
\ No newline at end of file
+    grid = np.full((len(row_keys), len(column_keys)), '', dtype=object)
+    grid.flat[list(cells)] = list(cells.values())
+    df = pd.DataFrame(grid, index=row_keys.set_names(index), columns=pd.Index([str(key) for key in column_keys], name=column),
+                      dtype=object).reset_index()
+    if 'day' in index:
+        df['day'] = df['day'].astype(str)
+    return df
@@ -0,0 +1,91 @@
+import inspect
+import threading
+from collections import Counter, OrderedDict
+from time import perf_counter
+from loguru import logger
+from optapy import solver_factory_create, score_manager_create, solver_manager_create
+
+from .constraints import get_solver_config
+
+# Each solver manager keeps its own thread pool; termination policies scale with problem size,
+# so idle managers beyond this many are closed, least recently used first
+MAX_SOLVER_MANAGERS = 4
+
+
+class SolverRegistry:
+    # Built solver factories, score managers and solver managers, keyed by the
+    # get_solver_config arguments. Building one parses the config and compiles the
+    # constraint provider on the JVM side, so each config is only built once per process.
+    def __init__(self):
+        self.solver_factories = {}
+        self.score_managers = {}
+        self.solver_managers = OrderedDict()
+        # Unfinished jobs per solver manager key; managers with any are never closed
+        self.solver_manager_jobs = Counter()
+        self.build_times = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def config_key(config):
+        # Defaults filled in, so solver_factory() and solver_factory(solving_duration=SOLVING_DURATION) share an entry
+        arguments = inspect.signature(get_solver_config).bind(**config)
+        arguments.apply_defaults()
+        return tuple(arguments.arguments.items())
+
+    def _get(self, cache, kind, config, build):
+        key = self.config_key(config)
+        with self.lock:
+            if key not in cache:
+                start = perf_counter()
+                cache[key] = build()
+                self.build_times[(kind, key)] = perf_counter() - start
+                logger.debug(f'Built {kind} for {key} in {self.build_times[(kind, key)]:.3f}s')
+            return cache[key]
+
+    def solver_factory(self, **config):
+        return self._get(self.solver_factories, 'solver factory', config,
+                         lambda: solver_factory_create(get_solver_config(**config)))
+
+    def score_manager(self, **config):
+        return self._get(self.score_managers, 'score manager', config,
+                         lambda: score_manager_create(self.solver_factory(**config)))
+
+    def solver_manager(self, **config):
+        # Pair every call with release_solver_manager(**config) once the job it was for has finished
+        key = self.config_key(config)
+        with self.lock:
+            solver_manager = self._get(self.solver_managers, 'solver manager', config,
+                                       lambda: solver_manager_create(get_solver_config(**config)))
+            self.solver_managers.move_to_end(key)
+            self.solver_manager_jobs[key] += 1
+            self._close_idle_solver_managers()
+            return solver_manager
+
+    def release_solver_manager(self, **config):
+        # Called from the manager's own solver thread, so closing is left to the next solver_manager()
+        key = self.config_key(config)
+        with self.lock:
+            self.solver_manager_jobs[key] -= 1
+            if self.solver_manager_jobs[key] <= 0:
+                del self.solver_manager_jobs[key]
+
+    def _close_idle_solver_managers(self):
+        idle = [key for key in self.solver_managers if key not in self.solver_manager_jobs]
+        for key in idle[:max(len(self.solver_managers) - MAX_SOLVER_MANAGERS, 0)]:
+            logger.debug(f'Closing idle solver manager for {key}')
+            self.solver_managers.pop(key).close()
+
+    def build_solver(self, **config):
+        return self.solver_factory(**config).buildSolver()
+
+
+_solver_registry = None
+_solver_registry_lock = threading.Lock()
+
+
+def get_solver_registry():
+    global _solver_registry
+    with _solver_registry_lock:
+        if _solver_registry is None:
+            _solver_registry = SolverRegistry()
+        return _solver_registry
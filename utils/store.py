@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from datetime import datetime
+from contextlib import closing
+from loguru import logger
+
+SCHEDULE_STORE_PATH = 'new_schedule/schedules.sqlite'
+SCHEDULE_COLUMNS = ['room', 'student_group', 'subject', 'teacher', 'day', 'start_time',
+                    'lesson_id', 'room_id', 'time_slot_id', 'schedule_id', 'text']
+# Intersecting student groups of a version, each pair once, as the solver's student conflict sees them
+GROUP_PAIR_COLUMNS = ['student_group', 'other_group', 'shared_students']
+# Rows ANALYZE samples per index after a save, enough for the planner to prefer the slot indexes
+ANALYSIS_LIMIT = 1000
+VERSION_SOLVE = 'solve'
+VERSION_EDIT = 'edit'
+VERSION_UPLOAD = 'upload'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER REFERENCES versions(id),
+    source TEXT NOT NULL,
+    score TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lessons (
+    version_id INTEGER NOT NULL REFERENCES versions(id),
+    lesson_id INTEGER NOT NULL,
+    time_slot_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    room TEXT,
+    student_group TEXT,
+    subject TEXT,
+    teacher TEXT,
+    day TEXT,
+    start_time TEXT,
+    schedule_id INTEGER,
+    text TEXT,
+    PRIMARY KEY (version_id, lesson_id)
+);
+CREATE TABLE IF NOT EXISTS group_pairs (
+    version_id INTEGER NOT NULL REFERENCES versions(id),
+    student_group TEXT NOT NULL,
+    other_group TEXT NOT NULL,
+    shared_students INTEGER,
+    PRIMARY KEY (version_id, student_group, other_group)
+);
+CREATE INDEX IF NOT EXISTS lessons_room_slot ON lessons (version_id, time_slot_id, room_id);
+CREATE INDEX IF NOT EXISTS lessons_teacher_slot ON lessons (version_id, teacher, time_slot_id);
+CREATE INDEX IF NOT EXISTS lessons_group_slot ON lessons (version_id, student_group, time_slot_id);
+CREATE INDEX IF NOT EXISTS group_pairs_other ON group_pairs (version_id, other_group);
+CREATE INDEX IF NOT EXISTS versions_parent ON versions (parent_id);
+'''
+
+# Lessons of one version sharing a timeslot and one of these columns
+CONFLICT_COLUMNS = {'room': 'room_id', 'teacher': 'teacher', 'group': 'student_group'}
+
+
+class ScheduleStore:
+    # Every solve or edit is a full snapshot of the raw schedule under a new version,
+    # edits point at the version they were made from
+    def __init__(self, path=SCHEDULE_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.lock, closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # Streamlit reruns come in on different threads, so each call opens its own connection
+        return sqlite3.connect(self.path)
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def save(self, raw_schedule_df, parent_id=None, source=VERSION_SOLVE, score=None, group_pairs_df=None):
+        # group_pairs_df has GROUP_PAIR_COLUMNS; without it a version keeps its parent's group pairs
+        rows = raw_schedule_df.reindex(columns=SCHEDULE_COLUMNS)
+        rows['start_time'] = rows['start_time'].astype(str)
+        with self.lock, closing(self._connect()) as connection:
+            with connection:
+                version_id = connection.execute(
+                    'INSERT INTO versions (parent_id, source, score, created_at) VALUES (?, ?, ?, ?)',
+                    (parent_id, source, score, datetime.now().isoformat(timespec='seconds')),
+                ).lastrowid
+                connection.executemany(
+                    f'INSERT INTO lessons (version_id, {", ".join(SCHEDULE_COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * (len(SCHEDULE_COLUMNS) + 1))})',
+                    ([version_id] + row for row in rows.astype(object).where(rows.notna(), None).values.tolist()),
+                )
+                if group_pairs_df is not None:
+                    # Only pairs of groups with lessons in this version
+                    groups = rows['student_group'].dropna().unique()
+                    pairs = group_pairs_df[group_pairs_df['student_group'].isin(groups) & group_pairs_df['other_group'].isin(groups)]
+                    connection.executemany(
+                        f'INSERT INTO group_pairs (version_id, {", ".join(GROUP_PAIR_COLUMNS)}) VALUES (?, ?, ?, ?)',
+                        ([version_id] + row for row in pairs[GROUP_PAIR_COLUMNS].astype(object).values.tolist()),
+                    )
+                elif parent_id is not None:
+                    connection.execute(
+                        f'INSERT INTO group_pairs (version_id, {", ".join(GROUP_PAIR_COLUMNS)}) '
+                        f'SELECT ?, {", ".join(GROUP_PAIR_COLUMNS)} FROM group_pairs WHERE version_id = ?',
+                        (version_id, parent_id))
+            # Statistics from a bounded sample, so the conflict self-joins use the slot indexes instead
+            # of scanning by lesson_id. PRAGMA optimize skips tables this connection only wrote to.
+            connection.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+            connection.execute('ANALYZE')
+        logger.debug(f'Saved schedule version {version_id} ({source}, parent {parent_id}) with {len(rows)} lessons')
+        return version_id
+
+    def load(self, version_id):
+        return self._query(
+            f'SELECT {", ".join(SCHEDULE_COLUMNS)} FROM lessons WHERE version_id = ? ORDER BY schedule_id, lesson_id',
+            (version_id,))
+
+    def versions(self):
+        return self._query(
+            'SELECT versions.*, COUNT(lessons.lesson_id) AS lessons FROM versions '
+            'LEFT JOIN lessons ON lessons.version_id = versions.id GROUP BY versions.id ORDER BY versions.id DESC')
+
+    def history(self, version_id):
+        # The version and its ancestors, newest first
+        return self._query(
+            'WITH RECURSIVE ancestors(id) AS (SELECT ? UNION ALL '
+            'SELECT versions.parent_id FROM versions JOIN ancestors ON versions.id = ancestors.id '
+            'WHERE versions.parent_id IS NOT NULL) '
+            'SELECT versions.* FROM versions JOIN ancestors ON versions.id = ancestors.id ORDER BY versions.id DESC',
+            (version_id,))
+
+    def occupants(self, version_id, time_slot_id, room_id=None, teacher=None, student_group=None):
+        # Who is in room X (or with teacher/group X) at slot Y
+        conditions, params = ['version_id = ?', 'time_slot_id = ?'], [version_id, time_slot_id]
+        for column, value in [('room_id', room_id), ('teacher', teacher), ('student_group', student_group)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        return self._query(
+            f'SELECT {", ".join(SCHEDULE_COLUMNS)} FROM lessons WHERE {" AND ".join(conditions)} ORDER BY lesson_id',
+            params)
+
+    def conflicts(self, version_id, lesson_id=None):
+        # Pairs of lessons sharing a timeslot and a room, teacher or group, or students of two groups
+        # stored as a group pair, like the solver's student conflict; only those of lesson_id when given
+        sources = [
+            (kind, f'a.{column}', f'lessons a JOIN lessons b ON b.version_id = a.version_id '
+                                  f'AND b.time_slot_id = a.time_slot_id AND b.{column} = a.{column} AND b.lesson_id > a.lesson_id')
+            for kind, column in CONFLICT_COLUMNS.items()
+        ]
+        sources.append(('students', "p.student_group || ' / ' || p.other_group",
+                        'group_pairs p JOIN lessons a ON a.version_id = p.version_id AND a.student_group = p.student_group '
+                        'JOIN lessons b ON b.version_id = p.version_id AND b.student_group = p.other_group '
+                        'AND b.time_slot_id = a.time_slot_id'))
+        filters, filter_params = ['a.version_id = ?'], [version_id]
+        if lesson_id is not None:
+            # Two primary key lookups, each joined to its partners through the slot indexes
+            filters, filter_params = ['a.version_id = ? AND a.lesson_id = ?', 'b.version_id = ? AND b.lesson_id = ?'], \
+                [version_id, lesson_id]
+        queries = [
+            f"SELECT '{kind}' AS conflict, a.time_slot_id AS time_slot_id, MIN(a.lesson_id, b.lesson_id) AS lesson_id, "
+            f"MAX(a.lesson_id, b.lesson_id) AS other_lesson_id, {shared} AS shared FROM {tables} WHERE {lesson_filter}"
+            for kind, shared, tables in sources for lesson_filter in filters
+        ]
+        return self._query(' UNION ALL '.join(queries) + ' ORDER BY time_slot_id, lesson_id, other_lesson_id',
+                           filter_params * len(queries))
+
+    def diff(self, version_id, other_version_id):
+        # Lessons moved, added or removed going from version_id to other_version_id
+        columns = 'lesson_id, time_slot_id, room_id, day, start_time, room'
+        return self._query(
+            f'WITH a AS (SELECT {columns} FROM lessons WHERE version_id = ?), '
+            f'b AS (SELECT {columns} FROM lessons WHERE version_id = ?) '
+            'SELECT a.lesson_id AS lesson_id, a.time_slot_id, a.room_id, a.day, a.start_time, a.room, '
+            'b.time_slot_id AS new_time_slot_id, b.room_id AS new_room_id, b.day AS new_day, '
+            'b.start_time AS new_start_time, b.room AS new_room '
+            'FROM a LEFT JOIN b ON b.lesson_id = a.lesson_id '
+            'WHERE b.lesson_id IS NULL OR b.time_slot_id != a.time_slot_id OR b.room_id != a.room_id '
+            'UNION ALL '
+            'SELECT b.lesson_id, NULL, NULL, NULL, NULL, NULL, b.time_slot_id, b.room_id, b.day, b.start_time, b.room '
+            'FROM b LEFT JOIN a ON a.lesson_id = b.lesson_id WHERE a.lesson_id IS NULL '
+            'ORDER BY lesson_id',
+            (version_id, other_version_id))
@@ -0,0 +1,138 @@
+import os
+import numpy as np
+import pandas as pd
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+STUDENTS_PER_PROGRAM = 100
+# Roughly the shape of new_schedule/input
+BASE_INSTANCE_SIZE = {'students': 430, 'groups': 100, 'subjects': 30, 'teachers': 45, 'rooms': 27}
+
+
+def scaled_instance_size(scale):
+    return {k: max(1, int(round(v * scale))) for k, v in BASE_INSTANCE_SIZE.items()}
+
+
+def _teacher_availability(rng):
+    # Mostly fully available, some on a few days only, some only in afternoon windows
+    kind = rng.choice(['full', 'days', 'window'], p=[0.6, 0.25, 0.15])
+    if kind == 'full':
+        return [1] * len(DAYS)
+    days = set(rng.choice(len(DAYS), size=rng.integers(2, 4), replace=False).tolist())
+    value = 1 if kind == 'days' else '13:30-16:20'
+    return [value if num in days else 0 for num in range(len(DAYS))]
+
+
+def generate_instance(students, groups, subjects, teachers, rooms, subjects_per_student=6, independent_programs=False, seed=0):
+    # Five frames with the same schema as the input workbook sheets.
+    # With independent_programs, programs share no subjects and no teachers.
+    rng = np.random.default_rng(seed)
+    programs = max(1, students // STUDENTS_PER_PROGRAM)
+    subject_names = [f'Subject {num}' for num in range(subjects)]
+    # Every 10th subject is open to all programs, the rest belong to one program
+    subject_program = [-1 if num % 10 == 9 and not independent_programs else num % programs for num in range(subjects)]
+    teacher_pools = [list(range(teachers))] * programs
+    if independent_programs:
+        teacher_pools = [list(range(program, teachers, programs)) or [program % teachers] for program in range(programs)]
+    student_program = rng.integers(0, programs, size=students)
+
+    program_subjects = [
+        [name for name, subject_program_id in zip(subject_names, subject_program) if subject_program_id in (-1, program)]
+        for program in range(programs)
+    ]
+    enrolled = {name: [] for name in subject_names}
+    for student in range(students):
+        candidates = program_subjects[student_program[student]]
+        picked = rng.choice(len(candidates), size=min(subjects_per_student, len(candidates)), replace=False)
+        for num in picked:
+            enrolled[candidates[num]].append(student)
+
+    # One lecture group per subject, the remaining groups split as practice groups by enrollment
+    sizes = np.array([len(enrolled[name]) for name in subject_names], dtype=float)
+    practice_total = max(groups - subjects, 0)
+    practice_groups = np.floor(practice_total * sizes / max(sizes.sum(), 1)).astype(int)
+    practice_groups[np.argsort(-sizes)[:practice_total - practice_groups.sum()]] += 1
+
+    student_columns = {}
+    group_records = []
+    lesson_records = []
+    group_id = 1000
+    for num, name in enumerate(subject_names):
+        members = enrolled[name]
+        if not members:
+            continue
+        teacher_pool = teacher_pools[subject_program[num]] if subject_program[num] >= 0 else list(range(teachers))
+        # Position of the subject within its teacher pool
+        teacher_slot = num // programs if independent_programs else num
+        lecturer = teacher_pool[teacher_slot % len(teacher_pool)]
+        lecture_group = f'S{num} (L)'
+        lecture_column = [np.nan] * students
+        for student in members:
+            lecture_column[student] = lecture_group
+        student_columns[name] = lecture_column
+        group_records.append((group_id, lecture_group, len(members), 'офлайн'))
+        group_id += 1
+        lesson_records.append((num, name, lecturer, lecture_group, 1 if practice_groups[num] else 2, 'офлайн', 1))
+
+        if practice_groups[num]:
+            practice_column = [np.nan] * students
+            shuffled = rng.permutation(members)
+            for practice_num in range(practice_groups[num]):
+                practice_group = f'S{num} (P) {practice_num}'
+                practice_members = shuffled[practice_num::practice_groups[num]]
+                for student in practice_members:
+                    practice_column[student] = practice_group
+                group_records.append((group_id, practice_group, len(practice_members), 'офлайн'))
+                group_id += 1
+                teacher = teacher_pool[(teacher_slot + 1 + practice_num) % len(teacher_pool)]
+                lesson_records.append((num, f'{name}.1', teacher, practice_group, 1, 'офлайн', 0))
+            student_columns[f'{name}.1'] = practice_column
+
+    teacher_names = [f'Teacher {num}' for num in range(teachers)]
+    students_df = pd.DataFrame({
+        'Прізвище': [f'Student {num}' for num in range(students)],
+        "Ім'я": [f'Name {num}' for num in range(students)],
+        'Спеціальність': [f'P{program}' for program in student_program],
+        **student_columns,
+    })
+
+    lessons_df = pd.DataFrame(lesson_records, columns=['id', 'subject', 'teacher', 'group', 'count', 'format', 'is_lection'])
+    lessons_df['teacher'] = [teacher_names[num] for num in lessons_df['teacher']]
+    lessons_df['recording'] = np.nan
+    lessons_df['min_days_between_two_lessons'] = np.nan
+
+    teachers_df = pd.DataFrame([_teacher_availability(rng) for _ in range(teachers)], columns=DAYS)
+    teachers_df.insert(0, 'name', teacher_names)
+    teachers_df.insert(0, 'Unnamed: 0', np.arange(5000, 5000 + teachers, dtype=float))
+    teachers_df['saturday'] = 0
+
+    # 70% seminar rooms, 20% medium, 10% lecture halls; the largest fits the largest group
+    capacities = np.concatenate([
+        rng.integers(20, 41, size=rooms),
+        rng.integers(50, 91, size=rooms),
+        rng.integers(100, 151, size=rooms),
+    ])[rng.choice([0, 1, 2], size=rooms, p=[0.7, 0.2, 0.1]) * rooms + np.arange(rooms)]
+    largest_group = max(size for _, _, size, _ in group_records)
+    capacities[np.argmax(capacities)] = max(capacities.max(), largest_group)
+    audiences_df = pd.DataFrame({
+        'id': np.arange(1000, 1000 + rooms),
+        'name_prefix': [f'№ {num}' for num in range(rooms)],
+        'name': [f'Room {num}' for num in range(rooms)],
+        'capacity': capacities,
+        'is_shelter_id': 1.0,
+    })
+
+    groups_df = pd.DataFrame(group_records, columns=['id', 'name', 'pupils', 'format'])
+    return {'audiences': audiences_df, 'groups': groups_df, 'students': students_df,
+            'lessons': lessons_df, 'teachers': teachers_df}
+
+
+def save_instance(frames, path):
+    os.makedirs(path, exist_ok=True)
+    for name, df in frames.items():
+        df.to_csv(os.path.join(path, f'{name}.csv'), index=False)
+
+
+def save_instance_workbook(frames, path):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, df in frames.items():
+            df.to_excel(writer, sheet_name=name, index=False)
@@ -0,0 +1,141 @@
+import re
+
+TERMINATION_BEST_SCORE = 'best score limit'
+TERMINATION_UNIMPROVED = 'unimproved time limit'
+TERMINATION_SPENT = 'time limit'
+TERMINATION_EARLY = 'terminated early'
+TERMINATION_UNKNOWN = 'unknown'
+
+# No conflicts and no lesson in a forbidden timeslot; moved lessons (soft) don't hold solving back
+FEASIBLE_SCORE_LIMIT = '0hard/0medium/*soft'
+# Re-solving an existing schedule only stops early once no lesson had to move
+UNCHANGED_SCORE_LIMIT = '0hard/0medium/0soft'
+SCORE_LEVELS = ['hard', 'medium', 'soft']
+SOLVING_DURATION = 10
+
+
+class TerminationPolicy:
+    # Solving stops at whichever limit is reached first. None disables a limit.
+    def __init__(self, name, best_score_limit=None, unimproved_seconds=None, spent_limit_seconds=None):
+        self.name = name
+        self.best_score_limit = best_score_limit
+        self.unimproved_seconds = unimproved_seconds
+        self.spent_limit_seconds = spent_limit_seconds
+
+    def _key(self):
+        return (self.name, self.best_score_limit, self.unimproved_seconds, self.spent_limit_seconds)
+
+    # Policies are part of the solver registry key
+    def __eq__(self, other):
+        return isinstance(other, TerminationPolicy) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return (f'TerminationPolicy({self.name!r}, best_score_limit={self.best_score_limit!r}, '
+                f'unimproved_seconds={self.unimproved_seconds}, spent_limit_seconds={self.spent_limit_seconds})')
+
+    def to_termination_config(self):
+        # Imported here, importing optapy.config starts the JVM
+        import optapy.config
+        from optapy.types import Duration
+
+        termination_config = optapy.config.solver.termination.TerminationConfig()
+        if self.best_score_limit is not None:
+            termination_config = termination_config.withBestScoreLimit(self.best_score_limit)
+        if self.unimproved_seconds is not None:
+            termination_config = termination_config.withUnimprovedSpentLimit(Duration.ofSeconds(self.unimproved_seconds))
+        if self.spent_limit_seconds is not None:
+            termination_config = termination_config.withSpentLimit(Duration.ofSeconds(self.spent_limit_seconds))
+        return termination_config
+
+    def termination_reason(self, score, time_spent_ms=None, best_solution_time_ms=None):
+        # Which limit ended a finished solve, from its final score and the solver's own timings.
+        # Timings the caller doesn't have from the solver are None, never wall-clock guesses.
+        if self.best_score_limit is not None and score_meets_limit(str(score), self.best_score_limit):
+            return TERMINATION_BEST_SCORE
+        if time_spent_ms is None:
+            return TERMINATION_UNKNOWN
+        if self.spent_limit_seconds is not None and time_spent_ms >= self.spent_limit_seconds * 1000:
+            return TERMINATION_SPENT
+        if self.unimproved_seconds is not None:
+            # Without the best solution time it is the only limit left that can have stopped the solver
+            if best_solution_time_ms is None or time_spent_ms - best_solution_time_ms >= self.unimproved_seconds * 1000:
+                return TERMINATION_UNIMPROVED
+        return TERMINATION_UNKNOWN
+
+
+def score_levels(score):
+    # "-2hard/-1medium/-10soft" -> {'hard': -2, 'medium': -1, 'soft': -10}
+    return {level: _level_value(value) for level, value in zip(SCORE_LEVELS, str(score).split('/'))}
+
+
+def is_feasible(score):
+    # Only genuine conflicts make a schedule unusable
+    return score_levels(score)['hard'] >= 0
+
+
+def score_meets_limit(score, limit):
+    # "0hard/0medium/-3soft" against "0hard/0medium/*soft": every level that is not * must be reached
+    score_levels = score.split('/')
+    limit_levels = limit.split('/')
+    if len(score_levels) != len(limit_levels):
+        return False
+    for score_level, limit_level in zip(score_levels, limit_levels):
+        if limit_level.startswith('*'):
+            continue
+        if _level_value(score_level) < _level_value(limit_level):
+            return False
+    return True
+
+
+def _level_value(level):
+    return int(re.match(r'-?[0-9]+', level).group(0))
+
+
+def fixed_policy(lesson_count=None, seconds=None):
+    # The original behaviour: always run for the full time
+    return TerminationPolicy('fixed', spent_limit_seconds=seconds or SOLVING_DURATION)
+
+
+def first_feasible_policy(lesson_count, seconds=None):
+    return TerminationPolicy('first_feasible', best_score_limit=FEASIBLE_SCORE_LIMIT,
+                             spent_limit_seconds=seconds or _spent_limit_seconds(lesson_count))
+
+
+def adaptive_policy(lesson_count, seconds=None):
+    # Stops once feasible, when the search has stalled, or at the hard cap, all scaled by problem size
+    return TerminationPolicy('adaptive', best_score_limit=FEASIBLE_SCORE_LIMIT,
+                             unimproved_seconds=_unimproved_seconds(lesson_count),
+                             spent_limit_seconds=seconds or _spent_limit_seconds(lesson_count))
+
+
+def minimal_changes_policy(lesson_count, seconds=None):
+    # Keeps reducing moves (soft) after the schedule is feasible, until stalled or at the hard cap
+    return TerminationPolicy('minimal_changes', best_score_limit=UNCHANGED_SCORE_LIMIT,
+                             unimproved_seconds=_unimproved_seconds(lesson_count),
+                             spent_limit_seconds=seconds or _spent_limit_seconds(lesson_count))
+
+
+def _unimproved_seconds(lesson_count):
+    return int(min(max(lesson_count / 50, 2), 60))
+
+
+def _spent_limit_seconds(lesson_count):
+    return int(min(max(lesson_count / 5, 10), 600))
+
+
+TERMINATION_POLICIES = {
+    'adaptive': adaptive_policy,
+    'first_feasible': first_feasible_policy,
+    'fixed': fixed_policy,
+    'minimal_changes': minimal_changes_policy,
+}
+
+
+def get_termination_policy(name, lesson_count, seconds=None):
+    # seconds overrides the hard cap
+    if name not in TERMINATION_POLICIES:
+        raise ValueError(f'Unknown termination policy {name!r}, expected one of {list(TERMINATION_POLICIES)}')
+    return TERMINATION_POLICIES[name](lesson_count, seconds)
@@ -76,3 +76,11 @@ def get_teacher_availability(df, timeslot_dict):
     availability = {k: foo(v) for k, v in availability.items()}
 
     return availability
+
+
+def get_availability_mask(timeslot_availability):
+    mask = 0
+    for timeslot_id, available in timeslot_availability.items():
+        if available == 1:
+            mask |= 1 << timeslot_id
+    return mask
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+from .time_utils import get_timeslot_list
+
+CONFLICT_COLUMNS = ['teacher_conflicts', 'group_conflicts', 'student_conflicts', 'room_conflicts',
+                    'capacity_conflict', 'teacher_unavailable']
+
+
+class AlternativeSlotFinder:
+    # Occupancy of the current schedule as count arrays per teacher, group and room x timeslot.
+    # Checking one lesson against every (timeslot, room) pair is a few numpy operations,
+    # so alternatives come back without running the solver.
+    def __init__(self, data_manager, raw_schedule_df):
+        self.timeslot_list = get_timeslot_list()
+        self.group_intersections = data_manager.group_intersections
+        num_timeslots = len(self.timeslot_list)
+
+        rooms_df = data_manager.input_audiences_df
+        self.room_ids = rooms_df['id'].to_numpy()
+        self.room_names = rooms_df['name'].tolist()
+        self.room_capacity = rooms_df['capacity'].to_numpy()
+        self.room_index = {room_id: num for num, room_id in enumerate(self.room_ids.tolist())}
+
+        lessons_df = data_manager.input_lessons_df
+        lessons_df = lessons_df[lessons_df['student_group_capacity'].notna()]
+        self.lessons = {
+            lesson_id: {
+                'teacher': data_manager.teacher_to_id.get(teacher_name),
+                'teacher_name': teacher_name,
+                'group': data_manager.group_to_id.get(group_name),
+                'group_name': group_name,
+                'subject': subject,
+                'capacity': int(capacity),
+            }
+            for lesson_id, teacher_name, group_name, subject, capacity in zip(
+                lessons_df['id'].tolist(), lessons_df['teacher'].tolist(), lessons_df['group'].tolist(),
+                lessons_df['subject'].tolist(), lessons_df['student_group_capacity'].tolist())
+        }
+
+        self.teacher_available = np.array([
+            [(data_manager.teachers_availability_mask[name] >> timeslot.id) & 1 for timeslot in self.timeslot_list]
+            for name in data_manager.teacher_to_id
+        ], dtype=bool).reshape(len(data_manager.teacher_to_id), num_timeslots)
+
+        self.teacher_occupancy = np.zeros((len(data_manager.teacher_to_id), num_timeslots), dtype=np.int32)
+        self.group_occupancy = np.zeros((len(self.group_intersections), num_timeslots), dtype=np.int32)
+        self.room_occupancy = np.zeros((len(self.room_ids), num_timeslots), dtype=np.int32)
+        self.assignments = {}
+        self.lessons_by_timeslot = [[] for _ in range(num_timeslots)]
+
+        for lesson_id, timeslot_id, room_id in zip(raw_schedule_df['lesson_id'].tolist(),
+                                                   raw_schedule_df['time_slot_id'].tolist(),
+                                                   raw_schedule_df['room_id'].tolist()):
+            if lesson_id not in self.lessons or room_id not in self.room_index:
+                continue
+            self.assignments[lesson_id] = (int(timeslot_id), room_id)
+            self._occupy(lesson_id, int(timeslot_id), room_id, 1)
+
+    def _occupy(self, lesson_id, timeslot_id, room_id, delta):
+        lesson = self.lessons[lesson_id]
+        if lesson['teacher'] is not None:
+            self.teacher_occupancy[lesson['teacher'], timeslot_id] += delta
+        if lesson['group'] is not None:
+            self.group_occupancy[lesson['group'], timeslot_id] += delta
+        self.room_occupancy[self.room_index[room_id], timeslot_id] += delta
+        if delta > 0:
+            self.lessons_by_timeslot[timeslot_id].append(lesson_id)
+        else:
+            self.lessons_by_timeslot[timeslot_id].remove(lesson_id)
+
+    def conflict_matrix(self, lesson_id):
+        # Conflicts of placing lesson_id at each (timeslot, room), with the lesson itself taken out
+        lesson = self.lessons[lesson_id]
+        current = self.assignments.get(lesson_id)
+        if current is not None:
+            self._occupy(lesson_id, current[0], current[1], -1)
+        try:
+            num_timeslots = len(self.timeslot_list)
+            shape = (num_timeslots, len(self.room_ids))
+            zeros = np.zeros(num_timeslots, dtype=np.int32)
+
+            # Copies, the occupancy arrays get this lesson back before returning
+            teacher_conflicts = self.teacher_occupancy[lesson['teacher']].copy() if lesson['teacher'] is not None else zeros
+            teacher_unavailable = ~self.teacher_available[lesson['teacher']] if lesson['teacher'] is not None else zeros.astype(bool)
+            if lesson['group'] is not None:
+                group_conflicts = self.group_occupancy[lesson['group']].copy()
+                neighbours = self.group_intersections.neighbours(lesson['group'])
+                student_conflicts = self.group_occupancy[neighbours].sum(axis=0)
+            else:
+                group_conflicts = student_conflicts = zeros
+
+            return {
+                'teacher_conflicts': np.broadcast_to(teacher_conflicts[:, None], shape),
+                'group_conflicts': np.broadcast_to(group_conflicts[:, None], shape),
+                'student_conflicts': np.broadcast_to(student_conflicts[:, None], shape),
+                'room_conflicts': self.room_occupancy.T.copy(),
+                'capacity_conflict': np.broadcast_to((self.room_capacity < lesson['capacity'])[None, :], shape).astype(np.int32),
+                'teacher_unavailable': np.broadcast_to(teacher_unavailable[:, None], shape).astype(np.int32),
+            }
+        finally:
+            if current is not None:
+                self._occupy(lesson_id, current[0], current[1], 1)
+
+    def find_alternatives(self, lesson_id, forbidden_timeslot_ids=(), limit=None):
+        # Conflict-free (timeslot, room) options, best first; if there are none,
+        # the options with the fewest conflicts instead
+        conflicts = self.conflict_matrix(lesson_id)
+        timeslot_index, room_index = np.indices(conflicts['room_conflicts'].shape)
+        options_df = pd.DataFrame({
+            'time_slot_id': timeslot_index.ravel(),
+            'room_id': self.room_ids[room_index.ravel()],
+            **{column: np.asarray(conflicts[column]).ravel() for column in CONFLICT_COLUMNS},
+        })
+        options_df['conflicts'] = options_df[CONFLICT_COLUMNS].sum(axis=1)
+        options_df = options_df[~options_df['time_slot_id'].isin([int(v) for v in forbidden_timeslot_ids])]
+        if options_df.empty:
+            return options_df
+
+        current_timeslot_id, current_room_id = self.assignments.get(lesson_id, (None, None))
+        capacity = self.room_capacity[room_index.ravel()][options_df.index]
+        # Prefer staying in the same room, then the tightest room that fits, then the nearest timeslot
+        options_df['same_room'] = options_df['room_id'] == current_room_id
+        options_df['spare_seats'] = np.abs(capacity - self.lessons[lesson_id]['capacity'])
+        options_df['timeslot_distance'] = np.abs(options_df['time_slot_id'] - (current_timeslot_id or 0))
+        options_df = options_df[options_df['conflicts'] == options_df['conflicts'].min()]
+        options_df = options_df.sort_values(['same_room', 'spare_seats', 'timeslot_distance', 'time_slot_id'],
+                                            ascending=[False, True, True, True])
+        if limit is not None:
+            options_df = options_df.head(limit)
+
+        options_df = options_df.drop(columns=['same_room', 'spare_seats', 'timeslot_distance']).reset_index(drop=True)
+        options_df['day'] = [self.timeslot_list[v].day_of_week for v in options_df['time_slot_id']]
+        options_df['start_time'] = [self.timeslot_list[v].start_time for v in options_df['time_slot_id']]
+        options_df['room'] = [self.room_names[self.room_index[v]] for v in options_df['room_id']]
+        return options_df
+
+    def describe_conflicts(self, lesson_id, timeslot_id, room_id):
+        # The lessons already at timeslot_id that clash with lesson_id placed in room_id
+        lesson = self.lessons[lesson_id]
+        neighbours = set()
+        if lesson['group'] is not None:
+            neighbours = set(self.group_intersections.neighbours(lesson['group']).tolist())
+
+        clashes = []
+        for other_id in self.lessons_by_timeslot[timeslot_id]:
+            if other_id == lesson_id:
+                continue
+            other = self.lessons[other_id]
+            reasons = []
+            if lesson['teacher'] is not None and other['teacher'] == lesson['teacher']:
+                reasons.append('teacher')
+            if lesson['group'] is not None and other['group'] == lesson['group']:
+                reasons.append('group')
+            if other['group'] in neighbours:
+                reasons.append('students')
+            if self.assignments[other_id][1] == room_id:
+                reasons.append('room')
+            if reasons:
+                clashes.append({'lesson_id': other_id, 'subject': other['subject'], 'group': other['group_name'],
+                                'teacher': other['teacher_name'], 'reason': ', '.join(reasons)})
+        return clashes
+
+    def apply_move(self, raw_schedule_df, lesson_id, timeslot_id, room_id):
+        # Copy of the raw schedule with lesson_id moved to (timeslot_id, room_id)
+        timeslot = self.timeslot_list[timeslot_id]
+        room_num = self.room_index[room_id]
+        new_raw_schedule_df = raw_schedule_df.copy()
+        row = new_raw_schedule_df['lesson_id'] == lesson_id
+        new_raw_schedule_df.loc[row, 'time_slot_id'] = timeslot_id
+        new_raw_schedule_df.loc[row, 'day'] = timeslot.day_of_week
+        new_raw_schedule_df.loc[row, 'start_time'] = str(timeslot.start_time)
+        new_raw_schedule_df.loc[row, 'room_id'] = room_id
+        new_raw_schedule_df.loc[row, 'room'] = f"{self.room_names[room_num]} [{self.room_capacity[room_num]}]"
+        return new_raw_schedule_df